@@ -0,0 +1,72 @@
+# job_executor.py
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import os
+import threading
+from typing import Any, Callable, Coroutine, Optional
+
+from .logger import logger
+
+
+class JobExecutor:
+    """Runs blocking STORM jobs on a dedicated worker pool.
+
+    `STORMWikiRunner.run` is fully synchronous and takes minutes, so it must never run on the
+    event loop. Jobs are executed on a thread pool (the runner holds LM clients and dspy state
+    that cannot be pickled across processes, and nearly all of its time is spent waiting on
+    network I/O, which releases the GIL). Worker threads use `post` to marshal coroutines such
+    as WebSocket updates back onto the loop that submitted the job.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        if max_workers is None:
+            max_workers = int(os.getenv("STORM_MAX_WORKERS", "2"))
+        self.max_workers = max(1, max_workers)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="storm-job"
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._active_jobs = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active_jobs(self) -> int:
+        return self._active_jobs
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `func(*args, **kwargs)` on the worker pool and await its result.
+
+        The function runs in a copy of the caller's context, so its records carry the caller's
+        log context (job and report IDs).
+        """
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            self._active_jobs += 1
+        logger.info(f"Dispatching job to worker pool ({self._active_jobs}/{self.max_workers} workers busy)")
+        try:
+            context = contextvars.copy_context()
+            return await self._loop.run_in_executor(
+                self._pool, functools.partial(context.run, func, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._active_jobs -= 1
+
+    def post(self, coro: Coroutine) -> Optional[concurrent.futures.Future]:
+        """Schedule a coroutine on the event loop from a worker thread.
+
+        Returns a concurrent future for the coroutine's result, or None if no loop is attached
+        (the coroutine is closed in that case so it does not leak a warning).
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            coro.close()
+            return None
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting jobs; pending jobs that have not started are cancelled."""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        logger.info("Job executor shut down")
@@ -0,0 +1,435 @@
+# job_queue.py
+import asyncio
+import os
+import sqlite3
+import time
+import traceback
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .logger import logger
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobExistsError(Exception):
+    """Raised when a job is submitted for a report_id that is still queued, running or coalesced."""
+
+    def __init__(self, report_id: str, status: str, position: Optional[int]):
+        super().__init__(f"Report {report_id} is already {status}")
+        self.report_id = report_id
+        self.status = status
+        self.position = position
+
+
+class JobQueue:
+    """Durable, prioritized queue for report generation jobs with admission control.
+
+    Jobs are persisted in a local SQLite database so queued work survives a restart, and jobs
+    that were running when the server stopped are put back in the queue. At most
+    `max_concurrency` jobs run at once; higher `priority` values are dispatched first and jobs
+    of equal priority run in submission order. Submissions beyond `max_queue_size` waiting jobs
+    are rejected with `QueueFullError` so a burst degrades into 429s instead of piling up runs
+    that all hit rate limits and time out.
+
+    Jobs submitted with the same `job_key` as a queued or running job are coalesced: they are
+    recorded as followers of that leader job instead of being run again, and share its status
+    and artifact directory once it finishes.
+
+    Cancelled jobs keep their row with status 'cancelled'. A job only stops running once every
+    report coalesced into it has been cancelled.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+    ):
+        if db_path is None:
+            db_path = os.getenv("STORM_QUEUE_DB", os.path.join("storage", "jobs.db"))
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("STORM_MAX_CONCURRENT_JOBS", "2"))
+        if max_queue_size is None:
+            max_queue_size = int(os.getenv("STORM_MAX_QUEUE_SIZE", "20"))
+        self.db_path = db_path
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue_size = max(0, max_queue_size)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # The queue is only touched from the event loop thread; check_same_thread is disabled
+        # because uvicorn may create the app in a different thread than the one running the loop.
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                report_id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                report_language TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                article_dir TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                job_key TEXT,
+                leader_id TEXT
+            )
+            """
+        )
+        self._ensure_column("job_key", "TEXT")
+        self._ensure_column("leader_id", "TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_dispatch ON jobs (status, priority DESC, created_at)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (job_key, status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_leader ON jobs (leader_id)")
+        # Jobs that were running when the server stopped go back in the queue
+        requeued = self._conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+        ).rowcount
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted job(s) from {db_path}")
+
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._run_job: Optional[Callable[[dict], Awaitable[bool]]] = None
+        self._manager = None
+
+    def _ensure_column(self, name: str, column_type: str):
+        """Add a column to a jobs table created by an older version of the queue."""
+        columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)").fetchall()]
+        if name not in columns:
+            self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+
+    @property
+    def running_count(self) -> int:
+        return len(self._running)
+
+    def queued_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def get(self, report_id: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT * FROM jobs WHERE report_id = ?", (report_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def position(self, report_id: str) -> Optional[int]:
+        """1-based position of a queued job, or None if it is not waiting in the queue."""
+        job = self.get(report_id)
+        if job is None or job["status"] != "queued":
+            return None
+        ahead = self._conn.execute(
+            """
+            SELECT COUNT(*) FROM jobs
+            WHERE status = 'queued'
+              AND (priority > ? OR (priority = ? AND created_at < ?))
+            """,
+            (job["priority"], job["priority"], job["created_at"]),
+        ).fetchone()[0]
+        return ahead + 1
+
+    def enqueue(
+        self,
+        report_id: str,
+        topic: str,
+        report_language: str,
+        priority: int = 0,
+        job_key: Optional[str] = None,
+    ) -> Optional[int]:
+        """Persist a new job and return its queue position.
+
+        If a queued or running job has the same `job_key`, the new job is attached to it as a
+        follower instead; the returned position is the leader's (None once the leader is running).
+
+        Raises:
+            JobExistsError: If a job with this report_id is still queued, running or coalesced.
+            QueueFullError: If `max_queue_size` jobs are already waiting.
+        """
+        self._check_not_active(report_id)
+        leader_id = self.find_active(job_key) if job_key is not None else None
+        if leader_id is not None and leader_id != report_id:
+            # A follower of a running leader shares the artifact directory it already has
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO jobs
+                    (report_id, topic, report_language, priority, status, article_dir, created_at, job_key, leader_id)
+                VALUES (?, ?, ?, ?, 'coalesced', (SELECT article_dir FROM jobs WHERE report_id = ?), ?, ?, ?)
+                """,
+                (report_id, topic, report_language, priority, leader_id, time.time(), job_key, leader_id),
+            )
+            logger.info(f"Coalesced report {report_id} into in-flight job {leader_id}")
+            return self.position(leader_id)
+
+        if self.queued_count() >= self.max_queue_size:
+            raise QueueFullError(
+                f"Report queue is full ({self.max_queue_size} jobs waiting). Please try again later."
+            )
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO jobs
+                (report_id, topic, report_language, priority, status, created_at, job_key)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?)
+            """,
+            (report_id, topic, report_language, priority, time.time(), job_key),
+        )
+        logger.info(f"Queued report {report_id} with priority {priority}")
+        self._notify()
+        return self.position(report_id)
+
+    def record_completed(
+        self,
+        report_id: str,
+        topic: str,
+        report_language: str,
+        article_dir: str,
+        job_key: Optional[str] = None,
+    ):
+        """Record a report that was answered without running a job (e.g. from the report cache).
+
+        Raises:
+            JobExistsError: If a job with this report_id is still queued, running or coalesced.
+        """
+        self._check_not_active(report_id)
+        now = time.time()
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO jobs
+                (report_id, topic, report_language, status, article_dir, created_at, finished_at, job_key)
+            VALUES (?, ?, ?, 'completed', ?, ?, ?, ?)
+            """,
+            (report_id, topic, report_language, article_dir, now, now, job_key),
+        )
+
+    def _check_not_active(self, report_id: str):
+        """Refuse to replace the row of a job that has not finished; a duplicate submission would
+        otherwise reset it to 'queued' and start a second run of the same report."""
+        job = self.get(report_id)
+        if job is not None and job["status"] in ("queued", "running", "coalesced"):
+            leader_id = job["leader_id"] or report_id
+            raise JobExistsError(report_id, job["status"], self.position(leader_id))
+
+    def find_active(self, job_key: str) -> Optional[str]:
+        """report_id of the queued or running leader job with this key, if any."""
+        row = self._conn.execute(
+            """
+            SELECT report_id FROM jobs
+            WHERE job_key = ? AND status IN ('queued', 'running') AND leader_id IS NULL
+            ORDER BY created_at ASC LIMIT 1
+            """,
+            (job_key,),
+        ).fetchone()
+        return row["report_id"] if row is not None else None
+
+    def leader_of(self, report_id: str) -> Optional[str]:
+        job = self.get(report_id)
+        return job["leader_id"] if job is not None else None
+
+    def subscribers(self, report_id: str) -> List[str]:
+        """The leader job followed by every report coalesced into it, except cancelled ones."""
+        rows = self._conn.execute(
+            """
+            SELECT report_id FROM jobs
+            WHERE (report_id = ? OR leader_id = ?) AND status != 'cancelled'
+            ORDER BY leader_id IS NOT NULL, created_at ASC
+            """,
+            (report_id, report_id),
+        ).fetchall()
+        return [row["report_id"] for row in rows]
+
+    def cancel(self, report_id: str) -> Optional[str]:
+        """Cancel a queued, running or coalesced report.
+
+        A cancelled queued leader hands its place in the queue to its oldest follower, and a
+        running leader keeps running while any follower still waits for it.
+
+        Returns the report_id of a running job that nobody is waiting for anymore and should be
+        stopped, or None.
+        """
+        job = self.get(report_id)
+        if job is None or job["status"] not in ("queued", "running", "coalesced"):
+            return None
+        self._conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE report_id = ?",
+            (time.time(), report_id),
+        )
+        logger.info(f"Cancelled report {report_id}")
+
+        leader_id = job["leader_id"] or report_id
+        leader = self.get(leader_id)
+        followers = [
+            row["report_id"]
+            for row in self._conn.execute(
+                """
+                SELECT report_id FROM jobs
+                WHERE leader_id = ? AND status = 'coalesced'
+                ORDER BY created_at ASC
+                """,
+                (leader_id,),
+            ).fetchall()
+        ]
+        if leader_id == report_id and job["status"] == "queued" and followers:
+            # The oldest follower takes over the cancelled job's place in the queue
+            new_leader_id = followers[0]
+            self._conn.execute(
+                """
+                UPDATE jobs SET status = 'queued', leader_id = NULL, priority = ?, created_at = ?
+                WHERE report_id = ?
+                """,
+                (job["priority"], job["created_at"], new_leader_id),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET leader_id = ? WHERE leader_id = ? AND status = 'coalesced'",
+                (new_leader_id, leader_id),
+            )
+            logger.info(f"Report {new_leader_id} took over cancelled job {leader_id}")
+        self._notify()
+
+        if leader["status"] == "cancelled" and not followers and leader_id in self._running:
+            return leader_id
+        return None
+
+    def requeue(self, report_id: str) -> Optional[int]:
+        """Put a failed job back in the queue, keeping its artifact directory so it can resume.
+
+        Returns its new queue position, or None if the job does not exist or has not failed.
+        """
+        updated = self._conn.execute(
+            """
+            UPDATE jobs SET status = 'queued', error = NULL, started_at = NULL, finished_at = NULL
+            WHERE report_id = ? AND status = 'failed' AND leader_id IS NULL
+            """,
+            (report_id,),
+        ).rowcount
+        if not updated:
+            return None
+        self._conn.execute(
+            "UPDATE jobs SET status = 'coalesced', error = NULL WHERE leader_id = ? AND status != 'cancelled'",
+            (report_id,),
+        )
+        logger.info(f"Requeued failed report {report_id}")
+        self._notify()
+        return self.position(report_id)
+
+    def mark_completed(self, report_id: str):
+        """Record a running job and the reports coalesced into it as completed.
+
+        Called once the report is on disk but before clients are told, so a client fetching it
+        right away is not answered with 409. The dispatcher records the final status again
+        when the run returns.
+        """
+        self._conn.execute(
+            """
+            UPDATE jobs SET status = 'completed', error = NULL, finished_at = ?
+            WHERE (report_id = ? OR leader_id = ?) AND status != 'cancelled'
+            """,
+            (time.time(), report_id, report_id),
+        )
+
+    def set_article_dir(self, report_id: str, article_dir: str):
+        self._conn.execute(
+            "UPDATE jobs SET article_dir = ? WHERE report_id = ? OR leader_id = ?",
+            (article_dir, report_id, report_id),
+        )
+
+    async def start(self, run_job: Callable[[dict], Awaitable[bool]], manager):
+        """Start dispatching queued jobs.
+
+        Args:
+            run_job: Coroutine function that runs one job (a row of the jobs table) and returns
+                True on success.
+            manager: ConnectionManager used to push queue position updates to waiting clients.
+        """
+        self._run_job = run_job
+        self._manager = manager
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        self._notify()
+        logger.info(
+            f"Job queue started (max_concurrency={self.max_concurrency}, max_queue_size={self.max_queue_size})"
+        )
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self._conn.close()
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_queued(self) -> Optional[dict]:
+        row = self._conn.execute(
+            """
+            SELECT * FROM jobs WHERE status = 'queued'
+            ORDER BY priority DESC, created_at ASC LIMIT 1
+            """
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def _queued_ids(self) -> List[str]:
+        rows = self._conn.execute(
+            "SELECT report_id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at ASC"
+        ).fetchall()
+        return [row["report_id"] for row in rows]
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while len(self._running) < self.max_concurrency:
+                    job = self._next_queued()
+                    if job is None:
+                        break
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? WHERE report_id = ?",
+                        (time.time(), job["report_id"]),
+                    )
+                    self._running[job["report_id"]] = asyncio.create_task(self._run(job))
+                await self._broadcast_positions()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error dispatching queued jobs: {str(e)}")
+                logger.error(traceback.format_exc())
+
+    async def _run(self, job: dict):
+        report_id = job["report_id"]
+        status, error = "failed", None
+        try:
+            if await self._run_job(job):
+                status = "completed"
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Queued job {report_id} failed: {error}")
+            logger.error(traceback.format_exc())
+        finally:
+            self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, error = ?, finished_at = ?
+                WHERE (report_id = ? OR leader_id = ?) AND status != 'cancelled'
+                """,
+                (status, error, time.time(), report_id, report_id),
+            )
+            self._running.pop(report_id, None)
+            self._notify()
+
+    async def _broadcast_positions(self):
+        queued_ids = self._queued_ids()
+        for position, leader_id in enumerate(queued_ids, start=1):
+            for report_id in self.subscribers(leader_id):
+                await self._manager.send_update(report_id, {
+                    "event": "queue_position",
+                    "report_id": report_id,
+                    "message": f"Waiting in queue at position {position}",
+                    "position": position,
+                    "queued": len(queued_ids),
+                    "running": len(self._running),
+                })
@@ -1,14 +1,16 @@
-import concurrent.futures
+import asyncio
 import dspy
 import functools
 import hashlib
 import json
 import logging
+import threading
 import time
 from abc import ABC, abstractmethod
 from collections import OrderedDict
 from typing import Dict, List, Optional, Union, TYPE_CHECKING
 
+from .transport import run_sync
 from .utils import ArticleTextProcessing
 
 logging.basicConfig(
@@ -20,6 +22,78 @@ if TYPE_CHECKING:
     from .logging_wrapper import LoggingWrapper
 
 
+class JobCancelledError(Exception):
+    """Raised inside a pipeline whose CancellationToken has been cancelled."""
+
+
+class CancellationToken:
+    """Thread-safe flag used to cooperatively stop a running pipeline.
+
+    The token is passed down through the engine, the modules and the retriever, and set on the
+    language models through `LMConfigs.set_cancel_token`. Loops check it between units of work
+    (stages, conversation turns, searches, sections) and the LM wrappers before every request,
+    retry and streamed chunk, so a cancelled run stops issuing new LM and retrieval calls and
+    unwinds with JobCancelledError.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelledError(self.reason)
+
+
+def raise_if_cancelled(cancel_token: Optional[CancellationToken]):
+    """Raise JobCancelledError if an (optional) cancellation token has been cancelled."""
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+
+class Deadline:
+    """Time budget of a job, shared by every LM and retrieval call it makes.
+
+    Calls derive their request timeout and retry cap from the remaining budget, so a single
+    call can no longer retry for longer than the whole job, and the pipeline checks `remaining`
+    to skip optional work once the budget is nearly spent.
+    """
+
+    def __init__(self, budget_seconds: float, min_request_timeout: float = 5.0):
+        self.expires_at = time.monotonic() + budget_seconds
+        self.min_request_timeout = min_request_timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def request_timeout(self, default: float) -> float:
+        """Timeout for one request: `default`, capped by the remaining budget."""
+        return max(self.min_request_timeout, min(default, self.remaining()))
+
+    def retry_budget(self, default: float) -> float:
+        """Total time a call may spend retrying: `default`, capped by the remaining budget."""
+        return min(default, self.remaining())
+
+    def reserve(self, seconds: float) -> "Deadline":
+        """A deadline that expires `seconds` before this one, keeping time for later stages."""
+        deadline = Deadline(0, self.min_request_timeout)
+        deadline.expires_at = self.expires_at - seconds
+        return deadline
+
+
 class InformationTable(ABC):
     """
     The InformationTable class serves as data class to store the information
@@ -269,6 +343,13 @@ class Retriever:
     def __init__(self, rm: dspy.Retrieve, max_thread: int = 1):
         self.max_thread = max_thread
         self.rm = rm
+        self.deadline: Optional[Deadline] = None
+
+    def set_deadline(self, deadline: Optional[Deadline]):
+        """Bound every search by a job deadline; searches are skipped once it has passed."""
+        self.deadline = deadline
+        if hasattr(self.rm, "deadline"):
+            self.rm.deadline = deadline
 
     def collect_and_reset_rm_usage(self):
         combined_usage = []
@@ -286,15 +367,43 @@ class Retriever:
         return name_to_usage
 
     def retrieve(
-        self, query: Union[str, List[str]], exclude_urls: List[str] = []
+        self,
+        query: Union[str, List[str]],
+        exclude_urls: List[str] = [],
+        cancel_token: Optional[CancellationToken] = None,
     ) -> List[Information]:
+        """Synchronous version of `aretrieve`, run on the shared background event loop."""
+        raise_if_cancelled(cancel_token)
+        return run_sync(self.aretrieve(query, exclude_urls, cancel_token))
+
+    async def aretrieve(
+        self,
+        query: Union[str, List[str]],
+        exclude_urls: List[str] = [],
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> List[Information]:
+        """Search for every query concurrently, at most `max_thread` at a time.
+
+        Retrievers with an `aforward` coroutine search without tying up a thread; others are
+        called in a worker thread.
+        """
+        raise_if_cancelled(cancel_token)
         queries = query if isinstance(query, list) else [query]
         to_return = []
-
-        def process_query(q):
-            retrieved_data_list = self.rm(
-                query_or_queries=[q], exclude_urls=exclude_urls
-            )
+        semaphore = asyncio.Semaphore(self.max_thread)
+
+        async def process_query(q):
+            async with semaphore:
+                raise_if_cancelled(cancel_token)
+                if self.deadline is not None and self.deadline.expired:
+                    logging.warning(f"Skipping search for '{q}': job deadline has passed")
+                    return []
+                if hasattr(self.rm, "aforward"):
+                    retrieved_data_list = await self.rm.aforward([q], exclude_urls)
+                else:
+                    retrieved_data_list = await asyncio.to_thread(
+                        self.rm, query_or_queries=[q], exclude_urls=exclude_urls
+                    )
             local_to_return = []
             for data in retrieved_data_list:
                 for i in range(len(data["snippets"])):
@@ -308,10 +417,7 @@ class Retriever:
                 local_to_return.append(storm_info)
             return local_to_return
 
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.max_thread
-        ) as executor:
-            results = list(executor.map(process_query, queries))
+        results = await asyncio.gather(*(process_query(q) for q in queries))
 
         for result in results:
             to_return.extend(result)
@@ -440,6 +546,18 @@ class LMConfigs(ABC):
                     f"Language model for {attr_name} is not initialized. Please call set_{attr_name}()"
                 )
 
+    def set_deadline(self, deadline: Optional[Deadline]):
+        """Bound every call of the configured language models by a job deadline."""
+        for attr_name in self.__dict__:
+            if "_lm" in attr_name and hasattr(getattr(self, attr_name), "deadline"):
+                getattr(self, attr_name).deadline = deadline
+
+    def set_cancel_token(self, cancel_token: Optional[CancellationToken]):
+        """Stop every call of the configured language models once `cancel_token` is cancelled."""
+        for attr_name in self.__dict__:
+            if "_lm" in attr_name and hasattr(getattr(self, attr_name), "cancel_token"):
+                getattr(self, attr_name).cancel_token = cancel_token
+
     def collect_and_reset_lm_history(self):
         history = []
         for attr_name in self.__dict__:
@@ -1,4 +1,5 @@
 import backoff
+import contextlib
 import dspy
 import functools
 import logging
@@ -6,7 +7,8 @@ import os
 import random
 import requests
 import threading
-from typing import Optional, Literal, Any
+import time
+from typing import Optional, Literal, Any, Callable, TYPE_CHECKING
 import ujson
 from pathlib import Path
 
@@ -14,9 +16,15 @@ from pathlib import Path
 from dsp import ERRORS, backoff_hdlr, giveup_hdlr
 from dsp.modules.hf import openai_to_hf
 from dsp.modules.hf_client import send_hftgi_request_v01_wrapped
-from openai import OpenAI, AzureOpenAI
+from openai import OpenAI, AzureOpenAI, BadRequestError
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
 from transformers import AutoTokenizer
 
+if TYPE_CHECKING:
+    from .interface import CancellationToken, Deadline
+
 try:
     from anthropic import RateLimitError
 except ImportError:
@@ -53,6 +61,57 @@ litellm.cache = Cache(disk_cache_dir=disk_cache_dir, type="disk")
 # litellm = LitellmPlaceholder()
 LM_LRU_CACHE_MAX_SIZE = 3000
 
+_stream_local = threading.local()
+
+
+@contextlib.contextmanager
+def stream_to(sink: Optional[Callable[[str], None]]):
+    """Stream completions requested in this thread to `sink`.
+
+    Inside the context, LM wrappers created with `stream=True` (AzureOpenAIModel, LitellmModel)
+    request a streamed completion and call `sink(delta)` with each piece of text as it arrives;
+    the full completion is still returned as usual. The sink is thread-local, so modules that
+    generate in a thread pool can stream each generation to its own sink. `sink=None` is a no-op.
+    """
+    previous = getattr(_stream_local, "sink", None)
+    if sink is not None:
+        _stream_local.sink = sink
+    try:
+        yield
+    finally:
+        _stream_local.sink = previous
+
+
+def current_stream_sink() -> Optional[Callable[[str], None]]:
+    return getattr(_stream_local, "sink", None)
+
+
+class StreamStats:
+    """Time to first token and generation throughput of one streamed completion."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.deltas = 0
+
+    def on_delta(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.deltas += 1
+
+    def finish(self, completion_tokens: Optional[int] = None) -> dict:
+        """Stats of the finished stream; the number of deltas stands in for missing token counts."""
+        finished_at = time.perf_counter()
+        tokens = completion_tokens if completion_tokens is not None else self.deltas
+        if self.first_token_at is None:
+            return {"time_to_first_token": None, "tokens_per_second": None, "completion_tokens": tokens}
+        generation_time = finished_at - self.first_token_at
+        return {
+            "time_to_first_token": self.first_token_at - self.started_at,
+            "tokens_per_second": tokens / generation_time if generation_time > 0 else None,
+            "completion_tokens": tokens,
+        }
+
 
 class LM:
     def __init__(
@@ -193,6 +252,11 @@ class LitellmModel(LM):
     """A wrapper class for LiteLLM.
 
     Check out https://docs.litellm.ai/docs/providers for usage details.
+
+    Note: with `stream=True`, chat completions requested inside `stream_to(sink)` are streamed to the
+    sink (bypassing the cache); their time to first token and tokens/sec are recorded in `history`.
+    Note: once `cancel_token` (see `LMConfigs.set_cancel_token`) is cancelled, no new request is sent
+    and a streamed completion stops at its next chunk, raising JobCancelledError.
     """
 
     def __init__(
@@ -200,9 +264,14 @@ class LitellmModel(LM):
         model: str = "openai/gpt-4o-mini",
         api_key: Optional[str] = None,
         model_type: Literal["chat", "text"] = "chat",
+        stream: bool = False,
         **kwargs,
     ):
         super().__init__(model=model, api_key=api_key, model_type=model_type, **kwargs)
+        self.stream = stream
+        # Cleared if the server rejects `stream_options`, after which usage is counted from the text
+        self.stream_usage = True
+        self.cancel_token: Optional["CancellationToken"] = None
         self._token_usage_lock = threading.Lock()
         self.prompt_tokens = 0
         self.completion_tokens = 0
@@ -231,11 +300,18 @@ class LitellmModel(LM):
         return usage
 
     def __call__(self, prompt=None, messages=None, **kwargs):
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
         # Build the request.
         cache = kwargs.pop("cache", self.cache)
         messages = messages or [{"role": "user", "content": prompt}]
         kwargs = {**self.kwargs, **kwargs}
 
+        sink = current_stream_sink() if self.stream else None
+        if sink is not None and self.model_type == "chat" and kwargs.get("n", 1) == 1:
+            return self._stream_completion(prompt, messages, sink, **kwargs)
+
         # Make the request and handle LRU & disk caching.
         if self.model_type == "chat":
             completion = cached_litellm_completion if cache else litellm_completion
@@ -244,9 +320,14 @@ class LitellmModel(LM):
                 cached_litellm_text_completion if cache else litellm_text_completion
             )
 
+        stats = StreamStats()
         response = completion(
             ujson.dumps(dict(model=self.model, messages=messages, **kwargs))
         )
+        return self._record(prompt, messages, kwargs, response, stats)
+
+    def _record(self, prompt, messages, kwargs, response, stats: StreamStats):
+        """Count the usage of a completion and add it to `history`, streamed or not."""
         response_dict = response.json()
         self.log_usage(response_dict)
         outputs = [
@@ -263,10 +344,53 @@ class LitellmModel(LM):
         entry = dict(
             **entry, cost=response.get("_hidden_params", {}).get("response_cost")
         )
+        entry = dict(
+            **entry, latency=stats.finish(response_dict["usage"].get("completion_tokens"))
+        )
         self.history.append(entry)
 
         return outputs
 
+    def _stream_completion(self, prompt, messages, sink, **kwargs):
+        """Request a streamed chat completion, forwarding each delta to `sink`."""
+        stats = StreamStats()
+        chunks = []
+        stream_options = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+        try:
+            for chunk in litellm.completion(
+                model=self.model,
+                messages=messages,
+                stream=True,
+                **stream_options,
+                **kwargs,
+            ):
+                if self.cancel_token is not None:
+                    # Stop consuming (and paying for) a completion nobody will read
+                    self.cancel_token.raise_if_cancelled()
+                chunks.append(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    stats.on_delta()
+                    sink(delta)
+        except litellm.BadRequestError as e:
+            if not stream_options or stats.deltas:
+                raise
+            # Some OpenAI-compatible servers reject `stream_options`
+            logging.warning(
+                f"{self.model} rejected stream_options ({str(e)}); streaming without usage reports."
+            )
+            self.stream_usage = False
+            return self._stream_completion(prompt, messages, sink, **kwargs)
+
+        # Rebuilt into the response a non-streamed request returns; usage the server did not
+        # report is counted from the text
+        response = litellm.stream_chunk_builder(chunks, messages=messages)
+        if response is None:
+            raise RuntimeError(f"Empty stream from {self.model}")
+        return self._record(prompt, messages, kwargs, response, stats)
+
 
 # ========================================================================
 # The following language model classes were deprecated after v1.1.0.
@@ -458,10 +582,30 @@ class DeepSeekModel(dspy.OpenAI):
         return completions
 
 
+# First Azure OpenAI API version that accepts `stream_options` on chat completions
+AZURE_STREAM_USAGE_API_VERSION = "2024-09-01-preview"
+
+
+def azure_supports_stream_usage(api_version: str) -> bool:
+    """Whether an Azure OpenAI API version (e.g. "2024-10-21" or "2024-08-01-preview") reports stream usage."""
+    return api_version[:10] >= AZURE_STREAM_USAGE_API_VERSION[:10]
+
+
 class AzureOpenAIModel(dspy.LM):
     """A wrapper class of Azure OpenAI endpoint.
 
     Note: param::model should match the deployment_id on your Azure platform.
+    Note: param::client can be an existing AzureOpenAI client. The client is thread-safe and owns the
+    HTTP connection pool, so several wrappers (e.g. one set per job) can share it while keeping their
+    own usage counters and history.
+    Note: if `deadline` is set (see `LMConfigs.set_deadline`), each request's timeout and the total
+    time spent retrying are capped by the time left in the job's budget.
+    Note: once `cancel_token` (see `LMConfigs.set_cancel_token`) is cancelled, no new request or retry
+    is sent and a streamed completion stops at its next chunk, raising JobCancelledError.
+    Note: with `stream=True`, chat completions requested inside `stream_to(sink)` are streamed to the
+    sink; their time to first token and tokens/sec are recorded in `history`. Usage is requested with
+    `stream_options` from AZURE_STREAM_USAGE_API_VERSION on (and dropped if the deployment rejects it),
+    otherwise it is estimated by counting deltas.
     """
 
     def __init__(
@@ -471,6 +615,8 @@ class AzureOpenAIModel(dspy.LM):
         model: str,
         api_key: str,
         model_type: Literal["chat", "text"] = "chat",
+        client: Optional[AzureOpenAI] = None,
+        stream: bool = False,
         **kwargs,
     ):
         super().__init__(model=model)
@@ -480,8 +626,13 @@ class AzureOpenAIModel(dspy.LM):
         self.model = model
         self.provider = "azure"
         self.model_type = model_type
+        self.stream = stream
+        # Usage of streamed completions is only reported by API versions that accept `stream_options`
+        self.stream_usage = azure_supports_stream_usage(api_version)
+        self.deadline: Optional["Deadline"] = None
+        self.cancel_token: Optional["CancellationToken"] = None
 
-        self.client = AzureOpenAI(
+        self.client = client or AzureOpenAI(
             azure_endpoint=azure_endpoint,
             api_key=api_key,
             api_version=api_version,
@@ -500,16 +651,119 @@ class AzureOpenAIModel(dspy.LM):
             **kwargs,
         }
 
-    @backoff.on_exception(
-        backoff.expo,
-        ERRORS,
-        max_time=1000,
-        on_backoff=backoff_hdlr,
-        giveup=giveup_hdlr,
-    )
+    def _with_retries(self, request: Callable) -> Callable:
+        max_time = 1000
+        if self.deadline is not None:
+            max_time = self.deadline.retry_budget(max_time)
+        return backoff.on_exception(
+            backoff.expo,
+            ERRORS,
+            max_time=max_time,
+            on_backoff=backoff_hdlr,
+            giveup=self._giveup,
+        )(request)
+
+    def _giveup(self, e: Exception) -> bool:
+        # A cancelled job stops retrying with JobCancelledError instead of the request's error
+        self._raise_if_cancelled()
+        return giveup_hdlr(e)
+
+    def _cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.is_cancelled
+
+    def _raise_if_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
     def basic_request(self, prompt: str, **kwargs) -> Any:
+        return self._with_retries(self._request)(prompt, **kwargs)
+
+    def stream_request(self, prompt: str, sink: Callable[[str], None], **kwargs) -> str:
+        """Request a streamed chat completion, forwarding each delta to `sink`, and return its text.
+
+        A request is only retried if it fails before any text was forwarded to the sink.
+        """
+        return self._with_retries(self._stream_request)(prompt, sink, **kwargs)
+
+    def _stream_request(self, prompt: str, sink: Callable[[str], None], **kwargs) -> str:
+        request_kwargs = {**self.kwargs, **kwargs, "stream": True}
+        if self.stream_usage:
+            request_kwargs["stream_options"] = {"include_usage": True}
+        if self.deadline is not None:
+            request_kwargs["timeout"] = self.deadline.request_timeout(request_kwargs.get("timeout", 600))
+        self._raise_if_cancelled()
+
+        stats = StreamStats()
+        parts = []
+        last_chunk = None
+        usage = None
+        finish_reason = None
+        try:
+            stream = self.client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}], **request_kwargs
+            )
+            for chunk in stream:
+                if self._cancelled():
+                    # Stop generating (and paying for) a completion nobody will read
+                    stream.close()
+                    self._raise_if_cancelled()
+                last_chunk = chunk
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices or chunk.choices[0].delta is None:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    stats.on_delta()
+                    parts.append(delta)
+                    sink(delta)
+        except BadRequestError as e:
+            if "stream_options" not in request_kwargs or stats.deltas:
+                raise
+            # Some deployments and OpenAI-compatible servers reject `stream_options`
+            logging.warning(
+                f"{self.model} rejected stream_options ({str(e)}); streaming without usage reports."
+            )
+            self.stream_usage = False
+            return self._stream_request(prompt, sink, **kwargs)
+        except ERRORS as e:
+            if stats.deltas:
+                # Retrying would send the same text to the sink twice
+                raise RuntimeError(f"Stream from Azure OpenAI interrupted: {str(e)}") from e
+            raise
+
+        if usage is None:
+            logging.warning(f"No usage reported for streamed completion of {self.model}; counting deltas.")
+            usage = CompletionUsage(
+                prompt_tokens=0, completion_tokens=stats.deltas, total_tokens=stats.deltas
+            )
+        text = "".join(parts)
+        # The same completion a non-streamed request returns, so history and usage are recorded alike
+        response = ChatCompletion(
+            id=last_chunk.id if last_chunk is not None else "",
+            created=last_chunk.created if last_chunk is not None else int(time.time()),
+            model=last_chunk.model if last_chunk is not None else self.model,
+            object="chat.completion",
+            choices=[
+                Choice(
+                    index=0,
+                    finish_reason=finish_reason or "stop",
+                    message=ChatCompletionMessage(role="assistant", content=text),
+                )
+            ],
+            usage=usage,
+        )
+        self._record(prompt, response, request_kwargs, stats)
+        return text
+
+    def _request(self, prompt: str, **kwargs) -> Any:
         kwargs = {**self.kwargs, **kwargs}
+        if self.deadline is not None:
+            kwargs["timeout"] = self.deadline.request_timeout(kwargs.get("timeout", 600))
+        self._raise_if_cancelled()
 
+        stats = StreamStats()
         try:
             if self.model_type == "chat":
                 messages = [{"role": "user", "content": prompt}]
@@ -520,14 +774,7 @@ class AzureOpenAIModel(dspy.LM):
             else:
                 response = self.client.completions.create(prompt=prompt, **kwargs)
 
-            self.log_usage(response)
-
-            history_entry = {
-                "prompt": prompt,
-                "response": dict(response),
-                "kwargs": kwargs,
-            }
-            self.history.append(history_entry)
+            self._record(prompt, response, kwargs, stats)
 
             return response
 
@@ -535,6 +782,20 @@ class AzureOpenAIModel(dspy.LM):
             logging.error(f"Error making request to Azure OpenAI: {str(e)}")
             raise
 
+    def _record(self, prompt: str, response: Any, kwargs: dict, stats: StreamStats):
+        """Count the usage of a completion and add it to `history`, streamed or not."""
+        self.log_usage(response)
+        self.history.append(
+            {
+                "prompt": prompt,
+                "response": response.model_dump(),
+                "kwargs": kwargs,
+                "latency": stats.finish(
+                    response.usage.completion_tokens if response.usage else None
+                ),
+            }
+        )
+
     def _get_choice_text(self, choice: Any) -> str:
         """Extract text from a choice object based on model type."""
         if self.model_type == "chat":
@@ -579,6 +840,14 @@ class AzureOpenAIModel(dspy.LM):
         Returns:
             List of completion strings
         """
+        sink = current_stream_sink() if self.stream else None
+        if (
+            sink is not None
+            and self.model_type == "chat"
+            and kwargs.get("n", self.kwargs["n"]) == 1
+        ):
+            return [self.stream_request(prompt, sink, **kwargs)]
+
         response = self.basic_request(prompt, **kwargs)
 
         choices = response.choices
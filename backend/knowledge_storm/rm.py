@@ -1,14 +1,23 @@
+import asyncio
+import hashlib
+import json
 import logging
 import os
-from typing import Callable, Union, List
+import re
+import threading
+import weakref
+from typing import Awaitable, Callable, Union, List, Optional, TYPE_CHECKING
 
 import backoff
 import dspy
-import requests
 from dsp import backoff_hdlr, giveup_hdlr
 
+from .transport import HTTPTransport, get_transport, run_sync
 from .utils import WebPageHelper
 
+if TYPE_CHECKING:
+    from .interface import Deadline
+
 
 class YouRM(dspy.Retrieve):
     def __init__(self, ydc_api_key=None, k=3, is_valid_source: Callable = None):
@@ -22,6 +31,9 @@ class YouRM(dspy.Retrieve):
         else:
             self.ydc_api_key = os.environ["YDC_API_KEY"]
         self.usage = 0
+        self.transport = get_transport("you")
+        # Set through Retriever.set_deadline to cap each search by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
 
         # If not None, is_valid_source shall be a function that takes a URL and returns a boolean.
         if is_valid_source:
@@ -37,6 +49,12 @@ class YouRM(dspy.Retrieve):
 
     def forward(
         self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
+    ):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
     ):
         """Search with You.com for self.k top passages for query or queries
 
@@ -57,10 +75,13 @@ class YouRM(dspy.Retrieve):
         for query in queries:
             try:
                 headers = {"X-API-Key": self.ydc_api_key}
-                results = requests.get(
-                    f"https://api.ydc-index.io/search?query={query}",
+                response = await self.transport.aget(
+                    "https://api.ydc-index.io/search",
                     headers=headers,
-                ).json()
+                    params={"query": query},
+                    deadline=self.deadline,
+                )
+                results = response.json()
 
                 authoritative_results = []
                 for r in results["hits"]:
@@ -112,6 +133,9 @@ class BingSearch(dspy.Retrieve):
             max_thread_num=webpage_helper_max_threads,
         )
         self.usage = 0
+        self.transport = get_transport("bing")
+        # Set through Retriever.set_deadline to cap each search by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
 
         # If not None, is_valid_source shall be a function that takes a URL and returns a boolean.
         if is_valid_source:
@@ -127,6 +151,12 @@ class BingSearch(dspy.Retrieve):
 
     def forward(
         self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
+    ):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
     ):
         """Search with Bing for self.k top passages for query or queries
 
@@ -150,9 +180,13 @@ class BingSearch(dspy.Retrieve):
 
         for query in queries:
             try:
-                results = requests.get(
-                    self.endpoint, headers=headers, params={**self.params, "q": query}
-                ).json()
+                response = await self.transport.aget(
+                    self.endpoint,
+                    headers=headers,
+                    params={**self.params, "q": query},
+                    deadline=self.deadline,
+                )
+                results = response.json()
 
                 for d in results["webPages"]["value"]:
                     if self.is_valid_source(d["url"]) and d["url"] not in exclude_urls:
@@ -164,8 +198,9 @@ class BingSearch(dspy.Retrieve):
             except Exception as e:
                 logging.error(f"Error occurs when searching query {query}: {e}")
 
-        valid_url_to_snippets = self.webpage_helper.urls_to_snippets(
-            list(url_to_results.keys())
+        # Fetching the pages is blocking work; keep it off the event loop
+        valid_url_to_snippets = await asyncio.to_thread(
+            self.webpage_helper.urls_to_snippets, list(url_to_results.keys())
         )
         collected_results = []
         for url in valid_url_to_snippets:
@@ -345,6 +380,9 @@ class StanfordOvalArxivRM(dspy.Retrieve):
         self.endpoint = endpoint
         self.usage = 0
         self.rerank = rerank
+        self.transport = get_transport("stanford_oval_arxiv")
+        # Set through Retriever.set_deadline to cap each search by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
 
     def get_usage_and_reset(self):
         usage = self.usage
@@ -352,11 +390,14 @@ class StanfordOvalArxivRM(dspy.Retrieve):
 
         return {"StanfordOvalArxivRM": usage}
 
-    def _retrieve(self, query: str):
+    async def _aretrieve(self, query: str):
         payload = {"query": query, "num_blocks": self.k, "rerank": self.rerank}
 
-        response = requests.post(
-            self.endpoint, json=payload, headers={"Content-Type": "application/json"}
+        response = await self.transport.apost(
+            self.endpoint,
+            json=payload,
+            headers={"Content-Type": "application/json"},
+            deadline=self.deadline,
         )
 
         # Check if the request was successful
@@ -386,6 +427,12 @@ class StanfordOvalArxivRM(dspy.Retrieve):
 
     def forward(
         self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
+    ):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
     ):
         collected_results = []
         queries = (
@@ -396,15 +443,165 @@ class StanfordOvalArxivRM(dspy.Retrieve):
 
         for query in queries:
             try:
-                results = self._retrieve(query)
+                results = await self._aretrieve(query)
                 collected_results.extend(results)
             except Exception as e:
                 logging.error(f"Error occurs when searching query {query}: {e}")
         return collected_results
 
 
+class SerperBatcher:
+    """Sends the queries of concurrent Serper searches in as few requests as possible.
+
+    One batcher can serve every SerperRM using the same API key (e.g. the retrievers of all jobs
+    of a server), so concurrent searches of different callers share requests. With a positive
+    `window`, the first search of a batch waits out the window, sends every query collected by
+    then and hands each search its slice of the results; searches arriving later start the next
+    batch. Only searches running on the same event loop are batched together.
+
+    If a request for several queries fails, its queries are retried one at a time, so a failure
+    only fails the searches whose own queries cannot be answered.
+    """
+
+    # Serper accepts up to this many queries in one request
+    MAX_BATCH_SIZE = 100
+
+    def __init__(
+        self,
+        serper_search_api_key: str,
+        transport: HTTPTransport,
+        window: float = 0.0,
+        search_url: str = "https://google.serper.dev/search",
+    ):
+        self.serper_search_api_key = serper_search_api_key
+        self.transport = transport
+        self.window = window
+        self.search_url = search_url
+        self._lock = threading.Lock()
+        self._batches = weakref.WeakKeyDictionary()
+
+    async def search(
+        self, params_list: List[dict], deadline: Optional["Deadline"] = None
+    ) -> List[dict]:
+        """Results of the queries in `params_list`, in the same order."""
+        if self.window <= 0:
+            return self._unwrap(await self.send(params_list, deadline))
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            batch = self._batches.get(loop)
+            leader = batch is None
+            if leader:
+                batch = self._batches[loop] = {
+                    "params": [],
+                    "deadlines": [],
+                    "results": loop.create_future(),
+                }
+            start = len(batch["params"])
+            batch["params"].extend(params_list)
+            batch["deadlines"].append(deadline)
+
+        if leader:
+            try:
+                await asyncio.sleep(self.window)
+                with self._lock:
+                    del self._batches[loop]
+                batch["results"].set_result(
+                    await self.send(batch["params"], self._latest(batch["deadlines"]))
+                )
+            except BaseException as e:
+                with self._lock:
+                    if self._batches.get(loop) is batch:
+                        del self._batches[loop]
+                if not batch["results"].done():
+                    # The other searches of the batch must not wait forever if this one is cancelled
+                    batch["results"].set_exception(
+                        e if isinstance(e, Exception) else RuntimeError("Serper batch was cancelled")
+                    )
+                if not isinstance(e, Exception):
+                    raise
+
+        # Shielded so that cancelling one search does not cancel the batch of the others
+        results = await asyncio.shield(batch["results"])
+        return self._unwrap(results[start : start + len(params_list)])
+
+    async def send(
+        self, params_list: List[dict], deadline: Optional["Deadline"] = None
+    ) -> List[Union[dict, Exception]]:
+        """Send the queries with one request per MAX_BATCH_SIZE queries.
+
+        The result of a query that failed on its own is the exception it failed with.
+        """
+        results = []
+        for start in range(0, len(params_list), self.MAX_BATCH_SIZE):
+            batch = params_list[start : start + self.MAX_BATCH_SIZE]
+            try:
+                results.extend(await self.request(batch, deadline))
+            except Exception as e:
+                if len(batch) == 1:
+                    results.append(e)
+                    continue
+                logging.warning(
+                    f"Serper request for {len(batch)} queries failed ({str(e)}); retrying them one at a time"
+                )
+                retried = await asyncio.gather(
+                    *(self.request([params], deadline) for params in batch),
+                    return_exceptions=True,
+                )
+                for params, result in zip(batch, retried):
+                    if isinstance(result, BaseException) and not isinstance(result, Exception):
+                        raise result
+                    results.append(result if isinstance(result, Exception) else result[0])
+        return results
+
+    async def request(
+        self, params_list: List[dict], deadline: Optional["Deadline"] = None
+    ) -> List[dict]:
+        """Send one request for the queries in `params_list`."""
+        headers = {
+            "X-API-KEY": self.serper_search_api_key,
+            "Content-Type": "application/json",
+        }
+        response = await self.transport.apost(
+            self.search_url, headers=headers, json=params_list, deadline=deadline
+        )
+        if response.is_error:
+            raise RuntimeError(
+                f"Error had occurred while running the search process.\n Error is {response.reason_phrase}, had failed with status code {response.status_code}"
+            )
+        results = response.json()
+        if not isinstance(results, list) or len(results) != len(params_list):
+            raise RuntimeError(
+                f"Unexpected response to a batch of {len(params_list)} Serper queries: {str(results)[:200]}"
+            )
+        return results
+
+    @staticmethod
+    def _latest(deadlines: List[Optional["Deadline"]]) -> Optional["Deadline"]:
+        """The deadline leaving the batch the most time, so no search is cut short by another's."""
+        if any(deadline is None for deadline in deadlines):
+            return None
+        return max(deadlines, key=lambda deadline: deadline.remaining())
+
+    @staticmethod
+    def _unwrap(results: List[Union[dict, Exception]]) -> List[dict]:
+        """Raise if every query of a search failed; otherwise failed queries have no results."""
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors and len(errors) == len(results):
+            raise errors[0]
+        for error in errors:
+            logging.error(f"Serper query failed: {str(error)}")
+        return [{} if isinstance(result, Exception) else result for result in results]
+
+
 class SerperRM(dspy.Retrieve):
-    """Retrieve information from custom queries using Serper.dev."""
+    """Retrieve information from custom queries using Serper.dev.
+
+    `forward` keeps its state per call and counts usage under a lock, so one instance can serve
+    the concurrent conversations of all personas. Requests are sent by a SerperBatcher through
+    the shared "serper" transport, whose connection pool should be at least as large as the
+    number of searches in flight at once.
+    """
 
     def __init__(
         self,
@@ -415,6 +612,10 @@ class SerperRM(dspy.Retrieve):
         min_char_count: int = 150,
         snippet_chunk_size: int = 1000,
         webpage_helper_max_threads=10,
+        batch_window: float = 0.0,
+        transport: Optional[HTTPTransport] = None,
+        pool_size: int = 10,
+        batcher: Optional[SerperBatcher] = None,
     ):
         """Args:
         serper_search_api_key str: API key to run serper, can be found by creating an account on https://serper.dev/
@@ -433,9 +634,17 @@ class SerperRM(dspy.Retrieve):
                 qdr:w str: Date time range for past week.
                 qdr:m str: Date time range for past month.
                 qdr:y str: Date time range for past year.
+        batch_window float: if positive, queries of concurrent searches arriving within this many seconds
+            are sent together. The queries of a single call are always sent in as few requests as possible.
+        transport HTTPTransport: transport to send the requests with. By default the shared "serper" transport,
+            which is created with `pool_size` connections if no retriever has used it yet.
+        batcher SerperBatcher: batcher to send the queries with, shared with other retrievers using the same API
+            key so that their concurrent searches are batched together. By default a batcher of this retriever
+            only, built from its API key, `transport` and `batch_window`.
         """
         super().__init__(k=k)
         self.usage = 0
+        self._usage_lock = threading.Lock()
         self.query_params = None
         self.ENABLE_EXTRA_SNIPPET_EXTRACTION = ENABLE_EXTRA_SNIPPET_EXTRACTION
         self.webpage_helper = WebPageHelper(
@@ -462,32 +671,43 @@ class SerperRM(dspy.Retrieve):
             self.serper_search_api_key = os.environ["SERPER_API_KEY"]
 
         self.base_url = "https://google.serper.dev"
-
-    def serper_runner(self, query_params):
         self.search_url = f"{self.base_url}/search"
-
-        headers = {
-            "X-API-KEY": self.serper_search_api_key,
-            "Content-Type": "application/json",
-        }
-
-        response = requests.request(
-            "POST", self.search_url, headers=headers, json=query_params
+        self.transport = (
+            transport
+            if transport is not None
+            else get_transport("serper", max_connections=pool_size)
         )
-
-        if response == None:
-            raise RuntimeError(
-                f"Error had occurred while running the search process.\n Error is {response.reason}, had failed with status code {response.status_code}"
+        # Set through Retriever.set_deadline to cap each search by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
+        self.batcher = (
+            batcher
+            if batcher is not None
+            else SerperBatcher(
+                self.serper_search_api_key,
+                self.transport,
+                window=batch_window,
+                search_url=self.search_url,
             )
+        )
 
-        return response.json()
+    async def serper_runner(self, query_params):
+        if isinstance(query_params, list):
+            return await self.batcher.request(query_params, self.deadline)
+        return (await self.batcher.request([query_params], self.deadline))[0]
 
     def get_usage_and_reset(self):
-        usage = self.usage
-        self.usage = 0
+        with self._usage_lock:
+            usage = self.usage
+            self.usage = 0
         return {"SerperRM": usage}
 
     def forward(self, query_or_queries: Union[str, List[str]], exclude_urls: List[str]):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str]
+    ):
         """
         Calls the API and searches for the query passed in.
 
@@ -505,40 +725,39 @@ class SerperRM(dspy.Retrieve):
             else query_or_queries
         )
 
-        self.usage += len(queries)
-        self.results = []
-        collected_results = []
-        for query in queries:
-            if query == "Queries:":
-                continue
-            query_params = self.query_params
-
-            # All available parameters can be found in the playground: https://serper.dev/playground
-            # Sets the json value for query to be the query that is being parsed.
-            query_params["q"] = query
-
-            # Sets the type to be search, can be images, video, places, maps etc that Google provides.
-            query_params["type"] = "search"
-
-            self.result = self.serper_runner(query_params)
-            self.results.append(self.result)
+        with self._usage_lock:
+            self.usage += len(queries)
+        # All available parameters can be found in the playground: https://serper.dev/playground
+        # Each query gets its own parameters, with the type set to search (can be images, video,
+        # places, maps etc that Google provides).
+        params_list = [
+            {**self.query_params, "q": query, "type": "search"}
+            for query in queries
+            if query != "Queries:"
+        ]
+        # All queries are sent together (in batches of up to MAX_BATCH_SIZE), and the results come
+        # back in the same order
+        results = await self.batcher.search(params_list, self.deadline) if params_list else []
 
         # Array of dictionaries that will be used by Storm to create the jsons
         collected_results = []
 
         if self.ENABLE_EXTRA_SNIPPET_EXTRACTION:
             urls = []
-            for result in self.results:
+            for result in results:
                 organic_results = result.get("organic", [])
                 for organic in organic_results:
                     url = organic.get("link")
                     if url:
                         urls.append(url)
-            valid_url_to_snippets = self.webpage_helper.urls_to_snippets(urls)
+            # Fetching the pages is blocking work; keep it off the event loop
+            valid_url_to_snippets = await asyncio.to_thread(
+                self.webpage_helper.urls_to_snippets, urls
+            )
         else:
             valid_url_to_snippets = {}
 
-        for result in self.results:
+        for result in results:
             try:
                 # An array of dictionaries that contains the snippets, title of the document and url that will be used.
                 organic_results = result.get("organic")
@@ -547,7 +766,7 @@ class SerperRM(dspy.Retrieve):
                     snippets = [organic.get("snippet")]
                     if self.ENABLE_EXTRA_SNIPPET_EXTRACTION:
                         snippets.extend(
-                            valid_url_to_snippets.get(url, {}).get("snippets", [])
+                            valid_url_to_snippets.get(organic.get("link"), {}).get("snippets", [])
                         )
                     collected_results.append(
                         {
@@ -581,6 +800,9 @@ class BraveRM(dspy.Retrieve):
         else:
             self.brave_search_api_key = os.environ["BRAVE_API_KEY"]
         self.usage = 0
+        self.transport = get_transport("brave")
+        # Set through Retriever.set_deadline to cap each search by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
 
         # If not None, is_valid_source shall be a function that takes a URL and returns a boolean.
         if is_valid_source:
@@ -596,6 +818,12 @@ class BraveRM(dspy.Retrieve):
 
     def forward(
         self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
+    ):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
     ):
         """Search with api.search.brave.com for self.k top passages for query or queries
 
@@ -620,11 +848,13 @@ class BraveRM(dspy.Retrieve):
                     "Accept-Encoding": "gzip",
                     "X-Subscription-Token": self.brave_search_api_key,
                 }
-                response = requests.get(
-                    f"https://api.search.brave.com/res/v1/web/search?result_filter=web&q={query}",
+                response = await self.transport.aget(
+                    "https://api.search.brave.com/res/v1/web/search",
                     headers=headers,
-                ).json()
-                results = response.get("web", {}).get("results", [])
+                    params={"result_filter": "web", "q": query},
+                    deadline=self.deadline,
+                )
+                results = response.json().get("web", {}).get("results", [])
 
                 for result in results:
                     collected_results.append(
@@ -665,6 +895,9 @@ class SearXNG(dspy.Retrieve):
         self.searxng_api_url = searxng_api_url
         self.searxng_api_key = searxng_api_key
         self.usage = 0
+        self.transport = get_transport("searxng")
+        # Set through Retriever.set_deadline to cap each search by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
 
         if is_valid_source:
             self.is_valid_source = is_valid_source
@@ -678,6 +911,12 @@ class SearXNG(dspy.Retrieve):
 
     def forward(
         self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
+    ):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
     ):
         """Search with SearxNG for self.k top passages for query or queries
 
@@ -704,8 +943,11 @@ class SearXNG(dspy.Retrieve):
         for query in queries:
             try:
                 params = {"q": query, "format": "json"}
-                response = requests.get(
-                    self.searxng_api_url, headers=headers, params=params
+                response = await self.transport.aget(
+                    self.searxng_api_url,
+                    headers=headers,
+                    params=params,
+                    deadline=self.deadline,
                 )
                 results = response.json()
 
@@ -780,20 +1022,29 @@ class DuckDuckGoSearchRM(dspy.Retrieve):
         # Import the duckduckgo search library found here: https://github.com/deedy5/duckduckgo_search
         self.ddgs = DDGS()
 
+        # Set through Retriever.set_deadline to cap retries by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
+
     def get_usage_and_reset(self):
         usage = self.usage
         self.usage = 0
         return {"DuckDuckGoRM": usage}
 
-    @backoff.on_exception(
-        backoff.expo,
-        (Exception,),
-        max_time=1000,
-        max_tries=8,
-        on_backoff=backoff_hdlr,
-        giveup=giveup_hdlr,
-    )
     def request(self, query: str):
+        max_time = 1000
+        if self.deadline is not None:
+            max_time = self.deadline.retry_budget(max_time)
+        request = backoff.on_exception(
+            backoff.expo,
+            (Exception,),
+            max_time=max_time,
+            max_tries=8,
+            on_backoff=backoff_hdlr,
+            giveup=giveup_hdlr,
+        )(self._request)
+        return request(query)
+
+    def _request(self, query: str):
         results = self.ddgs.text(
             query, max_results=self.k, backend=self.duck_duck_go_backend
         )
@@ -877,11 +1128,6 @@ class TavilySearchRM(dspy.Retrieve):
             include_raw_content bool: Boolean that is used to determine if the full text should be returned.
         """
         super().__init__(k=k)
-        try:
-            from tavily import TavilyClient
-        except ImportError as err:
-            raise ImportError("Tavily requires `pip install tavily-python`.") from err
-
         if not tavily_search_api_key and not os.environ.get("TAVILY_API_KEY"):
             raise RuntimeError(
                 "You must supply tavily_search_api_key or set environment variable TAVILY_API_KEY"
@@ -900,9 +1146,12 @@ class TavilySearchRM(dspy.Retrieve):
 
         self.usage = 0
 
-        # Creates client instance that will use search. Full search params are here:
-        # https://docs.tavily.com/docs/python-sdk/tavily-search/examples
-        self.tavily_client = TavilyClient(api_key=self.tavily_search_api_key)
+        # Searches go straight to the REST API. Full search params are here:
+        # https://docs.tavily.com/docs/rest-api/api-reference
+        self.search_url = "https://api.tavily.com/search"
+        self.transport = get_transport("tavily")
+        # Set through Retriever.set_deadline to cap each search by the job's remaining budget
+        self.deadline: Optional["Deadline"] = None
 
         self.include_raw_content = include_raw_content
 
@@ -919,6 +1168,12 @@ class TavilySearchRM(dspy.Retrieve):
 
     def forward(
         self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
+    ):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
     ):
         """Search with TavilySearch for self.k top passages for query or queries
         Args:
@@ -938,12 +1193,19 @@ class TavilySearchRM(dspy.Retrieve):
 
         for query in queries:
             args = {
+                "query": query,
                 "max_results": self.k,
-                "include_raw_contents": self.include_raw_content,
+                "include_raw_content": self.include_raw_content,
             }
             #  list of dicts that will be parsed to return
-            responseData = self.tavily_client.search(query)
-            results = responseData.get("results")
+            response = await self.transport.apost(
+                self.search_url,
+                headers={"Authorization": f"Bearer {self.tavily_search_api_key}"},
+                json=args,
+                deadline=self.deadline,
+            )
+            response.raise_for_status()
+            results = response.json().get("results")
             for d in results:
                 # assert d is dict
                 if not isinstance(d, dict):
@@ -1236,3 +1498,129 @@ class AzureAISearch(dspy.Retrieve):
                 logging.error(f"Error occurs when searching query {query}: {e}")
 
         return collected_results
+
+
+class CachedRM(dspy.Retrieve):
+    """Serves the results of any retriever from a persistent cache shared across jobs.
+
+    Each query is cached on its own under a key made of the normalized query (case and
+    whitespace folded), the wrapped retriever's class, `k` and `query_params`, and the excluded
+    URLs, so jobs searching for the same thing with the same settings share results. Entries
+    expire after `ttl` seconds, and the least recently used ones are evicted once the cache
+    outgrows its size limit. Empty results are not cached, as they are often transient failures.
+    """
+
+    def __init__(self, rm: dspy.Retrieve, cache, ttl: Optional[float] = 7 * 24 * 3600):
+        """Args:
+        rm dspy.Retrieve: the retriever whose results are cached.
+        cache diskcache.Cache: where the results are stored, usually shared by every job (see `open_cache`).
+        ttl float: seconds a result stays valid, or None to keep it until it is evicted.
+        """
+        super().__init__(k=rm.k)
+        self.rm = rm
+        self.cache = cache
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._usage_lock = threading.Lock()
+        params = {
+            "rm": type(rm).__name__,
+            "k": rm.k,
+            "query_params": getattr(rm, "query_params", None),
+        }
+        self.namespace = json.dumps(params, sort_keys=True, default=str)
+
+    @staticmethod
+    def open_cache(directory: str, size_limit: int):
+        """A disk cache in `directory` that evicts the least recently used entries past `size_limit` bytes."""
+        import diskcache
+
+        return diskcache.Cache(
+            directory,
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+
+    @property
+    def deadline(self) -> Optional["Deadline"]:
+        return getattr(self.rm, "deadline", None)
+
+    @deadline.setter
+    def deadline(self, deadline: Optional["Deadline"]):
+        # Retriever.set_deadline only sees the wrapper; searches happen in the wrapped retriever
+        if hasattr(self.rm, "deadline"):
+            self.rm.deadline = deadline
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    def cache_key(self, query: str, exclude_urls: List[str]) -> str:
+        key = json.dumps(
+            [self.namespace, self.normalize_query(query), sorted(exclude_urls)]
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get_usage_and_reset(self):
+        usage = {}
+        if hasattr(self.rm, "get_usage_and_reset"):
+            usage.update(self.rm.get_usage_and_reset())
+        with self._usage_lock:
+            usage["CachedRM.hits"], self.hits = self.hits, 0
+            usage["CachedRM.misses"], self.misses = self.misses, 0
+        return usage
+
+    def forward(self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []):
+        """Synchronous version of `aforward`."""
+        return run_sync(self.aforward(query_or_queries, exclude_urls))
+
+    async def aforward(
+        self, query_or_queries: Union[str, List[str]], exclude_urls: List[str] = []
+    ):
+        """Return the cached results of each query, searching with the wrapped retriever on a miss.
+
+        Returns:
+            a list of dictionaries in the wrapped retriever's format, in the order of the queries.
+        """
+        queries = (
+            [query_or_queries]
+            if isinstance(query_or_queries, str)
+            else query_or_queries
+        )
+        keys = [self.cache_key(query, exclude_urls) for query in queries]
+        # The cache is SQLite on local disk; its reads and writes stay off the shared event loop.
+        # Every read unpickles a fresh copy, so callers may modify the results freely.
+        cached = await asyncio.to_thread(self._get_many, keys)
+        misses = [i for i, results in enumerate(cached) if results is None]
+
+        # Misses are searched concurrently, so a batching retriever (e.g. SerperRM with a batch
+        # window) still sends them together
+        searched = await asyncio.gather(
+            *(self._search(queries[i], exclude_urls) for i in misses)
+        )
+        for i, results in zip(misses, searched):
+            cached[i] = results
+        # Written before returning, as callers may modify the results once they have them
+        await asyncio.to_thread(
+            self._set_many,
+            {keys[i]: results for i, results in zip(misses, searched) if results},
+        )
+
+        with self._usage_lock:
+            self.hits += len(queries) - len(misses)
+            self.misses += len(misses)
+        return [result for results in cached for result in results]
+
+    async def _search(self, query: str, exclude_urls: List[str]):
+        if hasattr(self.rm, "aforward"):
+            return await self.rm.aforward([query], exclude_urls)
+        return await asyncio.to_thread(
+            self.rm, query_or_queries=[query], exclude_urls=exclude_urls
+        )
+
+    def _get_many(self, keys: List[str]) -> list:
+        return [self.cache.get(key) for key in keys]
+
+    def _set_many(self, items: dict):
+        for key, results in items.items():
+            self.cache.set(key, results, expire=self.ttl)
@@ -1,7 +1,10 @@
+import concurrent.futures
+import copy
 from datetime import datetime
 import json
 import logging
 import os
+import time
 from dataclasses import dataclass, field
 from typing import Union, Literal, Optional
 
@@ -14,9 +17,21 @@ from .modules.knowledge_curation import StormKnowledgeCurationModule
 from .modules.outline_generation import StormOutlineGenerationModule
 from .modules.persona_generator import StormPersonaGenerator
 from .modules.storm_dataclass import StormInformationTable, StormArticle
-from ..interface import Engine, LMConfigs, Retriever
+from ..interface import (
+    Engine,
+    LMConfigs,
+    Retriever,
+    CancellationToken,
+    Deadline,
+    raise_if_cancelled,
+)
 from ..lm import LitellmModel
-from ..utils import FileIOHelper, makeStringRed, truncate_filename
+from ..utils import FileIOHelper, artifact_writer, makeStringRed, truncate_filename
+
+CHECKPOINT_FILE_NAME = "checkpoint.json"
+# Polishing renumbers the citations; url_to_info.json keeps the numbering of the draft article
+POLISHED_REFERENCES_FILE_NAME = "url_to_info_polished.json"
+STORM_STAGES = ["research", "outline", "article", "polish"]
 
 
 class STORMWikiLMConfigs(LMConfigs):
@@ -171,6 +186,43 @@ class STORMWikiRunnerArguments:
         default="English",
         metadata={"help": "Language of the report to be generated"}
     )
+    research_reserve_seconds: int = field(
+        default=240,
+        metadata={
+            "help": "When running with a deadline, stop asking new research questions once less than this many "
+            "seconds are left, keeping time for the outline, article and polishing stages."
+        },
+    )
+    polish_reserve_seconds: int = field(
+        default=60,
+        metadata={
+            "help": "When running with a deadline, skip polishing and keep the draft article if less than this "
+            "many seconds are left."
+        },
+    )
+    remove_duplicate_reserve_seconds: int = field(
+        default=120,
+        metadata={
+            "help": "When running with a deadline, skip removing duplicated content if less than this many "
+            "seconds are left."
+        },
+    )
+
+
+@dataclass
+class STORMWikiRunResult:
+    """Outcome of `STORMWikiRunner.run`, so callers need not read the artifacts back from disk."""
+
+    topic: str
+    article_dir: str
+    # Polished article, or the draft when polishing was skipped or not requested.
+    article: Optional[StormArticle]
+    # Reference map of the article, in the format of url_to_info.json.
+    references: dict
+    # Execution time, LM token usage and retrieval queries of each stage that ran.
+    usage: dict
+    # Completes once every artifact of the run is on disk; fails if one could not be written.
+    artifacts_written: concurrent.futures.Future
 
 
 class STORMWikiRunner(Engine):
@@ -220,6 +272,8 @@ class STORMWikiRunner(Engine):
         self,
         ground_truth_url: str = "None",
         callback_handler: BaseCallbackHandler = None,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline: Optional[Deadline] = None,
     ) -> StormInformationTable:
         (
             information_table,
@@ -231,6 +285,8 @@ class STORMWikiRunner(Engine):
             max_perspective=self.args.max_perspective,
             disable_perspective=False,
             return_conversation_log=True,
+            cancel_token=cancel_token,
+            deadline=deadline,
         )
 
         FileIOHelper.dump_json(
@@ -267,6 +323,7 @@ class STORMWikiRunner(Engine):
         outline: StormArticle,
         information_table=StormInformationTable,
         callback_handler: BaseCallbackHandler = None,
+        cancel_token: Optional[CancellationToken] = None,
     ) -> StormArticle:
         draft_article = self.storm_article_generation.generate_article(
             topic=self.topic,
@@ -274,30 +331,63 @@ class STORMWikiRunner(Engine):
             article_with_outline=outline,
             callback_handler=callback_handler,
             report_language=self.args.report_language,
+            cancel_token=cancel_token,
         )
-        draft_article.dump_article_as_plain_text(
-            os.path.join(self.article_output_dir, "storm_gen_article.txt")
+        self._write_artifact(
+            draft_article.dump_article_as_plain_text,
+            os.path.join(self.article_output_dir, "storm_gen_article.txt"),
         )
-        draft_article.dump_reference_to_file(
-            os.path.join(self.article_output_dir, "url_to_info.json")
+        self._write_artifact(
+            draft_article.dump_reference_to_file,
+            os.path.join(self.article_output_dir, "url_to_info.json"),
         )
         return draft_article
 
     def run_article_polishing_module(
-        self, draft_article: StormArticle, remove_duplicate: bool = False
+        self,
+        draft_article: StormArticle,
+        remove_duplicate: bool = False,
+        callback_handler: BaseCallbackHandler = None,
     ) -> StormArticle:
+        if callback_handler is not None:
+            callback_handler.on_article_polishing_start()
         polished_article = self.storm_article_polishing_module.polish_article(
             topic=self.topic,
             draft_article=draft_article,
             remove_duplicate=remove_duplicate,
             report_language=self.args.report_language,
+            callback_handler=callback_handler,
+        )
+        # References first, so the polished article is never on disk without its numbering
+        self._write_artifact(
+            polished_article.dump_reference_to_file,
+            os.path.join(self.article_output_dir, POLISHED_REFERENCES_FILE_NAME),
         )
-        FileIOHelper.write_str(
+        self._write_artifact(
+            FileIOHelper.write_str,
             polished_article.to_string(),
             os.path.join(self.article_output_dir, "storm_gen_article_polished.txt"),
         )
+        if callback_handler is not None:
+            lead_section = polished_article.find_section(polished_article.root, "summary")
+            callback_handler.on_article_polishing_end(
+                lead_section=lead_section.content if lead_section is not None else None
+            )
         return polished_article
 
+    def skip_article_polishing_module(self, draft_article: StormArticle) -> StormArticle:
+        """Use the draft article as the final article when there is no time left to polish it."""
+        self._write_artifact(
+            draft_article.dump_reference_to_file,
+            os.path.join(self.article_output_dir, POLISHED_REFERENCES_FILE_NAME),
+        )
+        self._write_artifact(
+            FileIOHelper.write_str,
+            draft_article.to_string(),
+            os.path.join(self.article_output_dir, "storm_gen_article_polished.txt"),
+        )
+        return draft_article
+
     def post_run(self):
         """
         Post-run operations, including:
@@ -320,6 +410,77 @@ class STORMWikiRunner(Engine):
                     )  # All kwargs are dumped together to run_config.json.
                 f.write(json.dumps(call) + "\n")
 
+    @staticmethod
+    def references_path(article_dir: str) -> str:
+        """Reference map numbered like the final (polished) article of an article directory.
+
+        Directories written before polished reference maps existed only have url_to_info.json.
+        """
+        polished_path = os.path.join(article_dir, POLISHED_REFERENCES_FILE_NAME)
+        if os.path.exists(polished_path):
+            return polished_path
+        return os.path.join(article_dir, "url_to_info.json")
+
+    @staticmethod
+    def load_checkpoint(article_dir: str) -> dict:
+        """
+        Load the stage checkpoint manifest of an article directory.
+
+        Returns:
+            A dict with `completed_stages` (a subset of STORM_STAGES in pipeline order). A missing or
+            unreadable manifest counts as no completed stage.
+        """
+        checkpoint_path = os.path.join(article_dir, CHECKPOINT_FILE_NAME)
+        if os.path.exists(checkpoint_path):
+            try:
+                return FileIOHelper.load_json(checkpoint_path)
+            except (ValueError, OSError) as e:
+                logging.warning(f"Ignoring unreadable checkpoint {checkpoint_path}: {e}")
+        return {"completed_stages": []}
+
+    def _mark_stage_completed(self, stage: str):
+        """Atomically record that a stage finished and its artifacts are on disk.
+
+        The checkpoint goes through the artifact writer after the stage's artifacts, so it is only
+        written once they are.
+        """
+        if stage not in self.checkpoint["completed_stages"]:
+            self.checkpoint["completed_stages"].append(stage)
+        self.checkpoint["topic"] = self.topic
+        self.checkpoint["updated_at"] = time.time()
+        self._write_artifact(
+            FileIOHelper.dump_json_atomic,
+            copy.deepcopy(self.checkpoint),
+            os.path.join(self.article_output_dir, CHECKPOINT_FILE_NAME),
+        )
+
+    def _write_artifact(self, func, *args):
+        """Write an artifact of the current run on the background artifact writer."""
+        self._pending_writes.append(artifact_writer.submit(func, *args))
+
+    def _wait_for_artifacts(self):
+        """Block until the pending artifact writes are done, logging those that failed."""
+        for future in concurrent.futures.as_completed(self._pending_writes):
+            if future.exception() is not None:
+                logging.error(f"Could not write an artifact to {self.article_output_dir}: {future.exception()}")
+        self._pending_writes = []
+
+    def _run_result(self, article: Optional[StormArticle]) -> STORMWikiRunResult:
+        artifacts_written = artifact_writer.barrier(self._pending_writes)
+        self._pending_writes = []
+        return STORMWikiRunResult(
+            topic=self.topic,
+            article_dir=self.article_output_dir,
+            article=article,
+            references=article.reference_to_dict() if article is not None else {},
+            usage={
+                "time": dict(self.time),
+                "lm_cost": dict(self.lm_cost),
+                "rm_cost": dict(self.rm_cost),
+            },
+            artifacts_written=artifacts_written,
+        )
+
     def _load_information_table_from_local_fs(self, information_table_local_path):
         assert os.path.exists(information_table_local_path), makeStringRed(
             f"{information_table_local_path} not exists. Please set --do-research argument to prepare the conversation_log.json for this topic."
@@ -360,6 +521,9 @@ class STORMWikiRunner(Engine):
         do_polish_article: bool = True,
         remove_duplicate: bool = False,
         callback_handler: BaseCallbackHandler = BaseCallbackHandler(),
+        resume: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline: Optional[Deadline] = None,
     ):
         """
         Run the STORM pipeline.
@@ -377,7 +541,39 @@ class STORMWikiRunner(Engine):
              duplicated content.
             remove_duplicate: If True, remove duplicated content.
             callback_handler: A callback handler to handle the intermediate results.
+            resume: If True, skip the stages recorded as completed in the checkpoint manifest of article_dir
+             and load their results from disk instead, so an interrupted run restarts from its last completed stage.
+            cancel_token: If cancelled, the run stops before its next LM request or search (a streamed completion
+             stops mid-stream) and raises JobCancelledError.
+             Stages completed before that stay recorded in the checkpoint manifest.
+            deadline: Time budget of the run. Every LM and search call is bounded by it, research stops early to
+             leave time for the later stages, and polishing (or only duplicate removal) is skipped when the budget
+             is nearly spent, so the run ends with a best-effort article instead of timing out.
+
+        Returns:
+            A STORMWikiRunResult with the final article and its references. Artifacts of the article and
+            polishing stages are written in the background; wait on `artifacts_written` before reading them.
         """
+        if resume and article_dir is not None:
+            completed_stages = self.load_checkpoint(article_dir)["completed_stages"]
+            if completed_stages:
+                logging.info(f"Resuming {topic} after completed stages: {completed_stages}")
+            do_research = do_research and "research" not in completed_stages
+            do_generate_outline = do_generate_outline and "outline" not in completed_stages
+            do_generate_article = do_generate_article and "article" not in completed_stages
+            do_polish_article = do_polish_article and "polish" not in completed_stages
+            if not (do_research or do_generate_outline or do_generate_article or do_polish_article):
+                self.topic = topic
+                self.article_output_dir = article_dir
+                self._pending_writes = []
+                return self._run_result(
+                    self._load_draft_article_from_local_fs(
+                        topic=topic,
+                        draft_article_path=os.path.join(article_dir, "storm_gen_article_polished.txt"),
+                        url_to_info_path=self.references_path(article_dir),
+                    )
+                )
+
         assert (
             do_research
             or do_generate_outline
@@ -393,60 +589,111 @@ class STORMWikiRunner(Engine):
 
         self.topic = topic
         self.article_output_dir = article_dir
+        self.lm_configs.set_deadline(deadline)
+        self.lm_configs.set_cancel_token(cancel_token)
+        self.retriever.set_deadline(deadline)
         os.makedirs(self.article_output_dir, exist_ok=True)
-
-        # research module
-        information_table: StormInformationTable = None
-        if do_research:
-            information_table = self.run_knowledge_curation_module(
-                ground_truth_url=ground_truth_url, callback_handler=callback_handler
-            )
-        # outline generation module
-        outline: StormArticle = None
-        if do_generate_outline:
-            # load information table if it's not initialized
-            if information_table is None:
-                information_table = self._load_information_table_from_local_fs(
-                    os.path.join(self.article_output_dir, "conversation_log.json")
-                )
-            outline = self.run_outline_generation_module(
-                information_table=information_table, callback_handler=callback_handler
-            )
-
-        # article generation module
-        draft_article: StormArticle = None
-        if do_generate_article:
-            if information_table is None:
-                information_table = self._load_information_table_from_local_fs(
-                    os.path.join(self.article_output_dir, "conversation_log.json")
-                )
-            if outline is None:
-                outline = self._load_outline_from_local_fs(
-                    topic=topic,
-                    outline_local_path=os.path.join(
-                        self.article_output_dir, "storm_gen_outline.txt"
+        self.checkpoint = self.load_checkpoint(self.article_output_dir)
+        # Stages from the first one executed onward no longer match what is on disk until they complete again.
+        first_stage_index = [
+            do_research,
+            do_generate_outline,
+            do_generate_article,
+            do_polish_article,
+        ].index(True)
+        self.checkpoint["completed_stages"] = [
+            stage
+            for stage in STORM_STAGES[:first_stage_index]
+            if stage in self.checkpoint["completed_stages"]
+        ]
+
+        self._pending_writes = []
+        try:
+            # research module
+            information_table: StormInformationTable = None
+            if do_research:
+                information_table = self.run_knowledge_curation_module(
+                    ground_truth_url=ground_truth_url,
+                    callback_handler=callback_handler,
+                    cancel_token=cancel_token,
+                    deadline=(
+                        deadline.reserve(self.args.research_reserve_seconds)
+                        if deadline is not None
+                        else None
                     ),
                 )
-            draft_article = self.run_article_generation_module(
-                outline=outline,
-                information_table=information_table,
-                callback_handler=callback_handler,
-            )
-
-        # article polishing module
-        if do_polish_article:
-            if draft_article is None:
-                draft_article_path = os.path.join(
-                    self.article_output_dir, "storm_gen_article.txt"
-                )
-                url_to_info_path = os.path.join(
-                    self.article_output_dir, "url_to_info.json"
+                self._mark_stage_completed("research")
+            # outline generation module
+            outline: StormArticle = None
+            if do_generate_outline:
+                raise_if_cancelled(cancel_token)
+                # load information table if it's not initialized
+                if information_table is None:
+                    information_table = self._load_information_table_from_local_fs(
+                        os.path.join(self.article_output_dir, "conversation_log.json")
+                    )
+                outline = self.run_outline_generation_module(
+                    information_table=information_table, callback_handler=callback_handler
                 )
-                draft_article = self._load_draft_article_from_local_fs(
-                    topic=topic,
-                    draft_article_path=draft_article_path,
-                    url_to_info_path=url_to_info_path,
+                self._mark_stage_completed("outline")
+
+            # article generation module
+            draft_article: StormArticle = None
+            if do_generate_article:
+                if information_table is None:
+                    information_table = self._load_information_table_from_local_fs(
+                        os.path.join(self.article_output_dir, "conversation_log.json")
+                    )
+                if outline is None:
+                    outline = self._load_outline_from_local_fs(
+                        topic=topic,
+                        outline_local_path=os.path.join(
+                            self.article_output_dir, "storm_gen_outline.txt"
+                        ),
+                    )
+                draft_article = self.run_article_generation_module(
+                    outline=outline,
+                    information_table=information_table,
+                    callback_handler=callback_handler,
+                    cancel_token=cancel_token,
                 )
-            self.run_article_polishing_module(
-                draft_article=draft_article, remove_duplicate=remove_duplicate
-            )
+                self._mark_stage_completed("article")
+
+            # article polishing module
+            final_article = draft_article
+            if do_polish_article:
+                raise_if_cancelled(cancel_token)
+                if draft_article is None:
+                    draft_article_path = os.path.join(
+                        self.article_output_dir, "storm_gen_article.txt"
+                    )
+                    url_to_info_path = os.path.join(
+                        self.article_output_dir, "url_to_info.json"
+                    )
+                    draft_article = self._load_draft_article_from_local_fs(
+                        topic=topic,
+                        draft_article_path=draft_article_path,
+                        url_to_info_path=url_to_info_path,
+                    )
+                if deadline is not None and deadline.remaining() < self.args.polish_reserve_seconds:
+                    logging.warning(f"Time budget nearly spent; skipping polishing for {topic}")
+                    final_article = self.skip_article_polishing_module(draft_article=draft_article)
+                else:
+                    if (
+                        remove_duplicate
+                        and deadline is not None
+                        and deadline.remaining() < self.args.remove_duplicate_reserve_seconds
+                    ):
+                        logging.warning(f"Time budget nearly spent; skipping duplicate removal for {topic}")
+                        remove_duplicate = False
+                    final_article = self.run_article_polishing_module(
+                        draft_article=draft_article,
+                        remove_duplicate=remove_duplicate,
+                        callback_handler=callback_handler,
+                    )
+                self._mark_stage_completed("polish")
+        except BaseException:
+            # A retry may resume from this directory, so leave it consistent before giving up
+            self._wait_for_artifacts()
+            raise
+        return self._run_result(final_article)
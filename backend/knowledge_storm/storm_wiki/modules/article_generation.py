@@ -1,14 +1,21 @@
 import concurrent.futures
 import copy
+import functools
 import logging
 from concurrent.futures import as_completed
-from typing import List, Union
+from typing import Callable, List, Optional, Union
 
 import dspy
 
 from .callback import BaseCallbackHandler
 from .storm_dataclass import StormInformationTable, StormArticle
-from ...interface import ArticleGenerationModule, Information
+from ...interface import (
+    ArticleGenerationModule,
+    Information,
+    CancellationToken,
+    raise_if_cancelled,
+)
+from ...lm import stream_to
 from ...utils import ArticleTextProcessing
 
 
@@ -33,8 +40,17 @@ class StormArticleGenerationModule(ArticleGenerationModule):
         self.section_gen = ConvToSection(engine=self.article_gen_lm)
 
     def generate_section(
-        self, topic, section_name, information_table, section_outline, section_query, report_language
+        self,
+        topic,
+        section_name,
+        information_table,
+        section_outline,
+        section_query,
+        report_language,
+        cancel_token: Optional[CancellationToken] = None,
+        callback_handler: BaseCallbackHandler = None,
     ):
+        raise_if_cancelled(cancel_token)
         collected_info: List[Information] = []
         if information_table is not None:
             collected_info = information_table.retrieve_information(
@@ -46,6 +62,11 @@ class StormArticleGenerationModule(ArticleGenerationModule):
             section=section_name,
             collected_info=collected_info,
             report_language=report_language,
+            stream_sink=(
+                functools.partial(callback_handler.on_section_delta, section_name)
+                if callback_handler is not None
+                else None
+            ),
         )
         return {
             "section_name": section_name,
@@ -60,6 +81,7 @@ class StormArticleGenerationModule(ArticleGenerationModule):
         article_with_outline: StormArticle,
         callback_handler: BaseCallbackHandler = None,
         report_language: str = None,
+        cancel_token: Optional[CancellationToken] = None,
     ) -> StormArticle:
         """
         Generate article for the topic based on the information table and article outline.
@@ -71,6 +93,8 @@ class StormArticleGenerationModule(ArticleGenerationModule):
             callback_handler (BaseCallbackHandler): An optional callback handler that can be used to trigger
                 custom callbacks at various stages of the article generation process. Defaults to None.
             report_language (str): Language of the report. If None, uses the language specified in the constructor.
+            cancel_token (CancellationToken): If cancelled, sections that have not started are dropped and
+                `JobCancelledError` is raised.
         """
         if report_language is None:
             report_language = self.report_language
@@ -82,7 +106,22 @@ class StormArticleGenerationModule(ArticleGenerationModule):
 
         sections_to_write = article_with_outline.get_first_level_section_names()
 
-        section_output_dict_collection = []
+        article = copy.deepcopy(article_with_outline)
+
+        def add_section(section_output_dict):
+            # Sections are merged as soon as they are written so they can be delivered right away
+            section_content = article.update_section(
+                parent_section_name=topic,
+                current_section_content=section_output_dict["section_content"],
+                current_section_info_list=section_output_dict["collected_info"],
+            )
+            if callback_handler is not None:
+                callback_handler.on_section_generation_end(
+                    section_name=section_output_dict["section_name"],
+                    section_content=section_content,
+                    references=article.get_references_for(section_content),
+                )
+
         if len(sections_to_write) == 0:
             logging.error(
                 f"No outline for {topic}. Will directly search with the topic."
@@ -94,8 +133,12 @@ class StormArticleGenerationModule(ArticleGenerationModule):
                 section_outline="",
                 section_query=[topic],
                 report_language=report_language,
+                cancel_token=cancel_token,
+                callback_handler=callback_handler,
             )
-            section_output_dict_collection = [section_output_dict]
+            if callback_handler is not None:
+                callback_handler.on_article_generation_start(sections=[topic])
+            add_section(section_output_dict)
         else:
             with concurrent.futures.ThreadPoolExecutor(
                 max_workers=self.max_thread_num
@@ -126,20 +169,27 @@ class StormArticleGenerationModule(ArticleGenerationModule):
                             section_outline,
                             section_query,
                             report_language,
+                            cancel_token,
+                            callback_handler,
                         )
                     ] = section_title
 
+                if callback_handler is not None:
+                    callback_handler.on_article_generation_start(
+                        sections=list(future_to_sec_title.values())
+                    )
                 for future in as_completed(future_to_sec_title):
-                    section_output_dict_collection.append(future.result())
+                    if cancel_token is not None and cancel_token.is_cancelled:
+                        for pending_future in future_to_sec_title:
+                            pending_future.cancel()
+                        cancel_token.raise_if_cancelled()
+                    add_section(future.result())
 
-        article = copy.deepcopy(article_with_outline)
-        for section_output_dict in section_output_dict_collection:
-            article.update_section(
-                parent_section_name=topic,
-                current_section_content=section_output_dict["section_content"],
-                current_section_info_list=section_output_dict["collected_info"],
-            )
         article.post_processing()
+        if callback_handler is not None:
+            callback_handler.on_article_generation_end(
+                section_order=article.get_first_level_section_names()
+            )
         return article
 
 
@@ -152,8 +202,15 @@ class ConvToSection(dspy.Module):
         self.engine = engine
 
     def forward(
-        self, topic: str, outline: str, section: str, collected_info: List[Information], report_language: str
+        self,
+        topic: str,
+        outline: str,
+        section: str,
+        collected_info: List[Information],
+        report_language: str,
+        stream_sink: Optional[Callable[[str], None]] = None,
     ):
+        """Write a section; if `stream_sink` is set, a streaming LM forwards the text to it as it is generated."""
         info = ""
         for idx, storm_info in enumerate(collected_info):
             info += f"[{idx + 1}]\n" + "\n".join(storm_info.snippets)
@@ -161,7 +218,7 @@ class ConvToSection(dspy.Module):
 
         info = ArticleTextProcessing.limit_word_count_preserve_newline(info, 1500)
 
-        with dspy.settings.context(lm=self.engine):
+        with dspy.settings.context(lm=self.engine), stream_to(stream_sink):
             section = ArticleTextProcessing.clean_up_section(
                 self.write_section(topic=topic, info=info, section=section, report_language=report_language).output
             )
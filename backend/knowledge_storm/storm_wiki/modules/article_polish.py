@@ -1,10 +1,13 @@
 import copy
-from typing import Union
+import functools
+from typing import Callable, Optional, Union
 
 import dspy
 
+from .callback import BaseCallbackHandler
 from .storm_dataclass import StormArticle
 from ...interface import ArticlePolishingModule
+from ...lm import stream_to
 from ...utils import ArticleTextProcessing
 
 
@@ -31,6 +34,7 @@ class StormArticlePolishingModule(ArticlePolishingModule):
 
     def polish_article(
         self, topic: str, draft_article: StormArticle, remove_duplicate: bool = False, report_language: str = None,
+        callback_handler: BaseCallbackHandler = None,
     ) -> StormArticle:
         """
         Polish article.
@@ -40,6 +44,7 @@ class StormArticlePolishingModule(ArticlePolishingModule):
             draft_article (StormArticle): The draft article.
             remove_duplicate (bool): Whether to use one additional LM call to remove duplicates from the article.
             report_language (str): Language of the report. If None, uses the language specified in the constructor.
+            callback_handler (BaseCallbackHandler): Optional handler that receives the polished text as it is generated.
 
         """
         if report_language is None:
@@ -49,6 +54,7 @@ class StormArticlePolishingModule(ArticlePolishingModule):
         polish_result = self.polish_page(
             topic=topic, draft_page=article_text, polish_whole_page=remove_duplicate,
             report_language=report_language,
+            stream_sink=callback_handler.on_polishing_delta if callback_handler is not None else None,
         )
         lead_section = f"# summary\n{polish_result.lead_section}"
         polished_article = "\n\n".join([lead_section, polish_result.page])
@@ -102,9 +108,20 @@ class PolishPageModule(dspy.Module):
         self.write_lead = dspy.Predict(WriteLeadSection)
         self.polish_page = dspy.Predict(PolishPage)
 
-    def forward(self, topic: str, draft_page: str, polish_whole_page: bool = True, report_language: str = "English"):
+    def forward(
+        self,
+        topic: str,
+        draft_page: str,
+        polish_whole_page: bool = True,
+        report_language: str = "English",
+        stream_sink: Optional[Callable[[str, str], None]] = None,
+    ):
+        """If `stream_sink` is set, streaming LMs forward the text to `stream_sink(part, delta)` as it is
+        generated, where part is "lead_section" or "page"."""
+        lead_sink = functools.partial(stream_sink, "lead_section") if stream_sink is not None else None
+        page_sink = functools.partial(stream_sink, "page") if stream_sink is not None else None
         # NOTE: Change show_guidelines to false to make the generation more robust to different LM families.
-        with dspy.settings.context(lm=self.write_lead_engine, show_guidelines=False):
+        with dspy.settings.context(lm=self.write_lead_engine, show_guidelines=False), stream_to(lead_sink):
             lead_section = self.write_lead(
                 topic=topic, draft_page=draft_page,  report_language=report_language
             ).lead_section
@@ -112,7 +129,7 @@ class PolishPageModule(dspy.Module):
                 lead_section = lead_section.split("The lead section:")[1].strip()
         if polish_whole_page:
             # NOTE: Change show_guidelines to false to make the generation more robust to different LM families.
-            with dspy.settings.context(lm=self.polish_engine, show_guidelines=False):
+            with dspy.settings.context(lm=self.polish_engine, show_guidelines=False), stream_to(page_sink):
                 page = self.polish_page(draft_page=draft_page, report_language=report_language).page
         else:
             page = draft_page
@@ -32,3 +32,33 @@ class BaseCallbackHandler:
     def on_outline_refinement_end(self, outline: str, **kwargs):
         """Run when the outline refinement finishes."""
         pass
+
+    def on_article_generation_start(self, sections: list[str], **kwargs):
+        """Run when the article generation starts."""
+        pass
+
+    def on_section_generation_end(
+        self, section_name: str, section_content: str, references: dict, **kwargs
+    ):
+        """Run when a section of the article is written and its citations are merged into the article's references."""
+        pass
+
+    def on_section_delta(self, section_name: str, delta: str, **kwargs):
+        """Run when a streaming LM generates more text of a section."""
+        pass
+
+    def on_article_generation_end(self, section_order: list[str], **kwargs):
+        """Run when the article generation finishes."""
+        pass
+
+    def on_article_polishing_start(self, **kwargs):
+        """Run when the article polishing starts."""
+        pass
+
+    def on_polishing_delta(self, part: str, delta: str, **kwargs):
+        """Run when a streaming LM generates more text of the lead section ("lead_section") or polished page ("page")."""
+        pass
+
+    def on_article_polishing_end(self, lead_section: str, **kwargs):
+        """Run when the article polishing finishes."""
+        pass
@@ -9,7 +9,14 @@ import dspy
 from .callback import BaseCallbackHandler
 from .persona_generator import StormPersonaGenerator
 from .storm_dataclass import DialogueTurn, StormInformationTable
-from ...interface import KnowledgeCurationModule, Retriever, Information
+from ...interface import (
+    KnowledgeCurationModule,
+    Retriever,
+    Information,
+    CancellationToken,
+    Deadline,
+    raise_if_cancelled,
+)
 from ...utils import ArticleTextProcessing
 
 try:
@@ -50,14 +57,24 @@ class ConvSimulator(dspy.Module):
         persona: str,
         ground_truth_url: str,
         callback_handler: BaseCallbackHandler,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline: Optional[Deadline] = None,
     ):
         """
         topic: The topic to research.
         persona: The persona of the Wikipedia writer.
         ground_truth_url: The ground_truth_url will be excluded from search to avoid ground truth leakage in evaluation.
+        cancel_token: If cancelled, the conversation stops before the next LM or search call.
+        deadline: If it has passed, no new turn is started and the conversation so far is returned.
         """
         dlg_history: List[DialogueTurn] = []
         for _ in range(self.max_turn):
+            raise_if_cancelled(cancel_token)
+            if deadline is not None and deadline.expired:
+                logging.warning(
+                    f"Research time budget spent; ending conversation after {len(dlg_history)} turns."
+                )
+                break
             user_utterance = self.wiki_writer(
                 topic=topic, persona=persona, dialogue_turns=dlg_history
             ).question
@@ -66,8 +83,12 @@ class ConvSimulator(dspy.Module):
                 break
             if user_utterance.startswith("Thank you so much for your help!"):
                 break
+            raise_if_cancelled(cancel_token)
             expert_output = self.topic_expert(
-                topic=topic, question=user_utterance, ground_truth_url=ground_truth_url
+                topic=topic,
+                question=user_utterance,
+                ground_truth_url=ground_truth_url,
+                cancel_token=cancel_token,
             )
             dlg_turn = DialogueTurn(
                 agent_utterance=expert_output.answer,
@@ -201,7 +222,13 @@ class TopicExpert(dspy.Module):
         self.max_search_queries = max_search_queries
         self.search_top_k = search_top_k
 
-    def forward(self, topic: str, question: str, ground_truth_url: str):
+    def forward(
+        self,
+        topic: str,
+        question: str,
+        ground_truth_url: str,
+        cancel_token: Optional[CancellationToken] = None,
+    ):
         with dspy.settings.context(lm=self.engine, show_guidelines=False):
             # Identify: Break down question into queries.
             queries = self.generate_queries(topic=topic, question=question).queries
@@ -212,8 +239,11 @@ class TopicExpert(dspy.Module):
             queries = queries[: self.max_search_queries]
             # Search
             searched_results: List[Information] = self.retriever.retrieve(
-                list(set(queries)), exclude_urls=[ground_truth_url]
+                list(set(queries)),
+                exclude_urls=[ground_truth_url],
+                cancel_token=cancel_token,
             )
+            raise_if_cancelled(cancel_token)
             if len(searched_results) > 0:
                 # Evaluate: Simplify this part by directly using the top 1 snippet.
                 info = ""
@@ -290,6 +320,8 @@ class StormKnowledgeCurationModule(KnowledgeCurationModule):
         ground_truth_url,
         considered_personas,
         callback_handler: BaseCallbackHandler,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline: Optional[Deadline] = None,
     ) -> List[Tuple[str, List[DialogueTurn]]]:
         """
         Executes multiple conversation simulations concurrently, each with a different persona,
@@ -306,6 +338,11 @@ class StormKnowledgeCurationModule(KnowledgeCurationModule):
                 will be conducted. Each persona is passed to `conv_simulator` individually.
             callback_handler (callable): A callback function that is passed to `conv_simulator`. It
                 should handle any callbacks or events during the simulation.
+            cancel_token (CancellationToken): Optional token passed to `conv_simulator`. Once it is
+                cancelled, conversations that have not started are dropped and running ones stop
+                at their next turn.
+            deadline (Deadline): Optional research deadline passed to `conv_simulator`. Conversations
+                stop starting new turns once it has passed.
 
         Returns:
             list of tuples: A list where each tuple contains a persona and its corresponding cleaned
@@ -320,6 +357,8 @@ class StormKnowledgeCurationModule(KnowledgeCurationModule):
                 ground_truth_url=ground_truth_url,
                 persona=persona,
                 callback_handler=callback_handler,
+                cancel_token=cancel_token,
+                deadline=deadline,
             )
 
         max_workers = min(self.max_thread_num, len(considered_personas))
@@ -336,6 +375,10 @@ class StormKnowledgeCurationModule(KnowledgeCurationModule):
                     add_script_run_ctx(t)
 
             for future in as_completed(future_to_persona):
+                if cancel_token is not None and cancel_token.is_cancelled:
+                    for pending_future in future_to_persona:
+                        pending_future.cancel()
+                    cancel_token.raise_if_cancelled()
                 persona = future_to_persona[future]
                 conv = future.result()
                 conversations.append(
@@ -352,18 +395,23 @@ class StormKnowledgeCurationModule(KnowledgeCurationModule):
         max_perspective: int = 0,
         disable_perspective: bool = True,
         return_conversation_log=False,
+        cancel_token: Optional[CancellationToken] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Union[StormInformationTable, Tuple[StormInformationTable, Dict]]:
         """
         Curate information and knowledge for the given topic
 
         Args:
             topic: topic of interest in natural language.
+            cancel_token: If cancelled, research stops issuing LM and search calls.
+            deadline: If set, conversations stop asking new questions once it has passed.
 
         Returns:
             collected_information: collected information in InformationTable type.
         """
 
         # identify personas
+        raise_if_cancelled(cancel_token)
         callback_handler.on_identify_perspective_start()
         considered_personas = []
         if disable_perspective:
@@ -382,6 +430,8 @@ class StormKnowledgeCurationModule(KnowledgeCurationModule):
             ground_truth_url=ground_truth_url,
             considered_personas=considered_personas,
             callback_handler=callback_handler,
+            cancel_token=cancel_token,
+            deadline=deadline,
         )
 
         information_table = StormInformationTable(conversations)
@@ -1,5 +1,6 @@
 import copy
 import re
+import threading
 from collections import OrderedDict
 from typing import Union, Optional, Any, List, Tuple, Dict
 
@@ -10,6 +11,21 @@ from sklearn.metrics.pairwise import cosine_similarity
 from ...interface import Information, InformationTable, Article, ArticleSectionNode
 from ...utils import ArticleTextProcessing, FileIOHelper
 
+_encoders: Dict[str, SentenceTransformer] = {}
+_encoders_lock = threading.Lock()
+
+
+def _get_shared_encoder(model_name: str = "paraphrase-MiniLM-L6-v2") -> SentenceTransformer:
+    """Load the sentence encoder once per process and share it across information tables.
+
+    Loading the model takes seconds and hundreds of MB, so concurrent jobs reuse one instance;
+    inference through `encode` is safe to call from multiple threads.
+    """
+    with _encoders_lock:
+        if model_name not in _encoders:
+            _encoders[model_name] = SentenceTransformer(model_name)
+        return _encoders[model_name]
+
 
 class DialogueTurn:
     def __init__(
@@ -107,7 +123,7 @@ class StormInformationTable(InformationTable):
         return cls(conversations)
 
     def prepare_table_for_retrieval(self):
-        self.encoder = SentenceTransformer("paraphrase-MiniLM-L6-v2")
+        self.encoder = _get_shared_encoder("paraphrase-MiniLM-L6-v2")
         self.collected_urls = []
         self.collected_snippets = []
         for url, information in self.url_to_info.items():
@@ -251,7 +267,7 @@ class StormArticle(Article):
         current_section_content: str,
         current_section_info_list: List[Information],
         parent_section_name: Optional[str] = None,
-    ) -> Optional[ArticleSectionNode]:
+    ) -> str:
         """
         Add new section to the article.
 
@@ -261,7 +277,7 @@ class StormArticle(Article):
             current_section_content: optional section content.
 
         Returns:
-            the ArticleSectionNode for current section if successfully created / updated. Otherwise none.
+            the section content with its citations remapped to the article's unified reference index.
         """
 
         if current_section_info_list is not None:
@@ -272,10 +288,11 @@ class StormArticle(Article):
             if len(references) > 0:
                 max_ref_num = max(references)
                 if max_ref_num > len(current_section_info_list):
-                    for i in range(len(current_section_info_list), max_ref_num + 1):
-                        current_section_content = current_section_content.replace(
-                            f"[{i}]", ""
-                        )
+                    num_info = len(current_section_info_list)
+                    current_section_content = ArticleTextProcessing.render_citations(
+                        current_section_content, lambda n: "" if n >= num_info else None
+                    )
+                    for i in range(num_info, max_ref_num + 1):
                         if i in references:
                             references.remove(i)
             # for any reference that is not used, trim it from current_section_info_list
@@ -297,6 +314,25 @@ class StormArticle(Article):
             parent_section_name=parent_section_name,
             trim_children=False,
         )
+        return current_section_content
+
+    def get_references_for(self, content: str) -> Dict:
+        """
+        Return the references cited in a piece of the article's content.
+
+        Args:
+            content: text with citations in the article's unified reference index, e.g. a section.
+
+        Returns:
+            a dictionary with 'url_to_unified_index' and 'url_to_info' (as dictionaries) restricted to the cited urls.
+        """
+        cited_indices = set(ArticleTextProcessing.parse_citation_indices(content))
+        references = {"url_to_unified_index": {}, "url_to_info": {}}
+        for url, index in self.reference["url_to_unified_index"].items():
+            if index in cited_indices:
+                references["url_to_unified_index"][url] = index
+                references["url_to_info"][url] = self.reference["url_to_info"][url].to_dict()
+        return references
 
     def get_outline_as_list(
         self,
@@ -477,11 +513,17 @@ class StormArticle(Article):
         outline = self.get_outline_as_list(add_hashtags=True, include_root=False)
         FileIOHelper.write_str("\n".join(outline), file_path)
 
+    def reference_to_dict(self) -> dict:
+        """The reference map with each Information converted to a dict, as in url_to_info.json."""
+        return {
+            "url_to_unified_index": dict(self.reference["url_to_unified_index"]),
+            "url_to_info": {
+                url: info.to_dict() for url, info in self.reference["url_to_info"].items()
+            },
+        }
+
     def dump_reference_to_file(self, file_path):
-        reference = copy.deepcopy(self.reference)
-        for url in reference["url_to_info"]:
-            reference["url_to_info"][url] = reference["url_to_info"][url].to_dict()
-        FileIOHelper.dump_json(reference, file_path)
+        FileIOHelper.dump_json(self.reference_to_dict(), file_path)
 
     def dump_article_as_plain_text(self, file_path):
         text = self.to_string()
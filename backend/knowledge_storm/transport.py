@@ -0,0 +1,377 @@
+import asyncio
+import bisect
+import concurrent.futures
+import contextvars
+import importlib.util
+import logging
+import random
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Dict, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from .interface import Deadline
+
+# HTTP/2 is negotiated when the optional `h2` package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Responses worth another attempt: rate limited or a transient server error
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class LatencyHistogram:
+    """Counts request latencies into fixed buckets (upper bounds in seconds)."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self.counts)
+            total = self.total
+        count = sum(counts)
+        buckets = {f"le_{bound:g}s": n for bound, n in zip(self.BUCKETS, counts)}
+        buckets["inf"] = counts[-1]
+        return {
+            "count": count,
+            "mean_seconds": round(total / count, 4) if count else None,
+            "buckets": buckets,
+        }
+
+
+class RateLimiter:
+    """Token bucket of `burst` requests refilled at `rate` requests per second (0 disables it).
+
+    `reserve` takes a token and returns how long the caller must wait before using it, so the
+    waiting happens outside the lock and works the same for threads and coroutines.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = max(1, burst if burst is not None else int(rate) or 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RetryBudget:
+    """Caps retries to a fraction of the requests sent, so an outage is not amplified by retries.
+
+    Every request deposits `ratio` tokens (up to `max_tokens`) and every retry spends one.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class HTTPTransport:
+    """Pooled HTTP client of one search provider, shared by every retriever and job using it.
+
+    Requests reuse keep-alive connections (HTTP/2 where available), at most `max_connections`
+    at a time, and are rate limited to `rate` per second. Connection errors and the statuses in
+    RETRY_STATUS_CODES are retried up to `max_attempts` times with jittered exponential backoff,
+    within the provider's retry budget and the caller's deadline; the last response is returned
+    (or the last error raised) once retrying stops. Latencies are recorded per provider.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_connections: int = 20,
+        rate: float = 0.0,
+        burst: Optional[int] = None,
+        timeout: float = 30.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+        retry_ratio: float = 0.2,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rate_limiter = RateLimiter(rate, burst)
+        self.retry_budget = RetryBudget(retry_ratio)
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self._stats_lock = threading.Lock()
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.client = httpx.Client(**self._client_kwargs())
+        # Async connections belong to the event loop that opened them
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._async_lock = threading.Lock()
+
+    def _client_kwargs(self) -> dict:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "limits": self._limits,
+            "timeout": self.timeout,
+            "follow_redirects": True,
+        }
+
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(**self._client_kwargs())
+                self._async_clients[loop] = client
+        return client
+
+    def _request_timeout(self, deadline: Optional["Deadline"]) -> float:
+        return deadline.request_timeout(self.timeout) if deadline is not None else self.timeout
+
+    def _record(self, started: float, response: Optional[httpx.Response]):
+        self.latency.observe(time.monotonic() - started)
+        with self._stats_lock:
+            self.requests += 1
+            if response is None or response.status_code >= 500:
+                self.failures += 1
+
+    def _retry_delay(
+        self,
+        attempt: int,
+        response: Optional[httpx.Response],
+        deadline: Optional["Deadline"],
+    ) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the request should not be retried."""
+        if response is not None and response.status_code not in RETRY_STATUS_CODES:
+            return None
+        if attempt + 1 >= self.max_attempts:
+            return None
+        # Full jitter: a random wait of up to the exponential backoff
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        if deadline is not None and delay >= deadline.remaining():
+            return None
+        if not self.retry_budget.withdraw():
+            return None
+        with self._stats_lock:
+            self.retries += 1
+        logging.info(f"Retrying {self.name} request in {delay:.2f}s (attempt {attempt + 2})")
+        return delay
+
+    def request(
+        self, method: str, url: str, deadline: Optional["Deadline"] = None, **kwargs
+    ) -> httpx.Response:
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            time.sleep(self.rate_limiter.reserve())
+            started = time.monotonic()
+            try:
+                response = self.client.request(
+                    method, url, timeout=self._request_timeout(deadline), **kwargs
+                )
+            except httpx.TransportError:
+                self._record(started, None)
+                delay = self._retry_delay(attempt, None, deadline)
+                if delay is None:
+                    raise
+            else:
+                self._record(started, response)
+                delay = self._retry_delay(attempt, response, deadline)
+                if delay is None:
+                    return response
+            attempt += 1
+            time.sleep(delay)
+
+    async def arequest(
+        self, method: str, url: str, deadline: Optional["Deadline"] = None, **kwargs
+    ) -> httpx.Response:
+        self.retry_budget.deposit()
+        client = self.async_client()
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.rate_limiter.reserve())
+            started = time.monotonic()
+            try:
+                response = await client.request(
+                    method, url, timeout=self._request_timeout(deadline), **kwargs
+                )
+            except httpx.TransportError:
+                self._record(started, None)
+                delay = self._retry_delay(attempt, None, deadline)
+                if delay is None:
+                    raise
+            else:
+                self._record(started, response)
+                delay = self._retry_delay(attempt, response, deadline)
+                if delay is None:
+                    return response
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counters = {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+            }
+        return {**counters, "http2": HTTP2_AVAILABLE, "latency": self.latency.snapshot()}
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+# Threads for the blocking work of searches on the background loop (see `set_blocking_workers`)
+_blocking_workers = 32
+_blocking_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+
+def _install_blocking_executor(loop: asyncio.AbstractEventLoop):
+    global _blocking_executor
+    previous = _blocking_executor
+    _blocking_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=_blocking_workers, thread_name_prefix="storm-search-worker"
+    )
+    loop.set_default_executor(_blocking_executor)
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def set_blocking_workers(max_workers: int):
+    """Size the pool that runs the blocking work of searches on the background loop.
+
+    Synchronous retrievers and webpage fetches run in this pool, shared by every job, so it
+    should be large enough for the searches of all concurrent jobs (e.g. the number of jobs
+    times their search threads). Work already running on a previous pool finishes there.
+    """
+    global _blocking_workers
+    with _loop_lock:
+        _blocking_workers = max(1, max_workers)
+        if _loop is not None:
+            _install_blocking_executor(_loop)
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """The event loop, running in a daemon thread, on which synchronous callers' searches run.
+
+    Every search of every job started from a thread is a coroutine on this one loop, so
+    concurrent searches cost coroutines rather than threads and share its async connections.
+    """
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _install_blocking_executor(_loop)
+            _loop_thread = threading.Thread(
+                target=_loop.run_forever, name="storm-search-loop", daemon=True
+            )
+            _loop_thread.start()
+    return _loop
+
+
+def run_sync(coro):
+    """Run `coro` on the background loop and wait for its result from a synchronous caller.
+
+    The coroutine runs in a copy of the caller's context, so the log context of the job
+    follows it. Must not be called from the background loop itself.
+    """
+    loop = background_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync cannot wait on the background loop from inside it")
+    future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def on_done(task: asyncio.Task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def start():
+        # Tasks run in the context current at their creation
+        task = context.run(loop.create_task, coro)
+        task.add_done_callback(on_done)
+
+    loop.call_soon_threadsafe(start)
+    return future.result()
+
+
+_transports: Dict[str, HTTPTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(name: str, **settings) -> HTTPTransport:
+    """The shared transport of provider `name`, created with `settings` on first use.
+
+    Later calls return the existing transport and ignore their settings, so whoever configures
+    a provider (e.g. the server at startup) should ask for it before any retriever does.
+    """
+    with _transports_lock:
+        transport = _transports.get(name)
+        if transport is None:
+            transport = HTTPTransport(name, **settings)
+            _transports[name] = transport
+    return transport
+
+
+def transport_stats() -> dict:
+    """Request counts and latency histograms of every provider used so far."""
+    with _transports_lock:
+        transports = list(_transports.values())
+    return {transport.name: transport.stats() for transport in transports}
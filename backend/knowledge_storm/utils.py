@@ -1,5 +1,6 @@
 import concurrent.futures
 import dspy
+import html
 import httpx
 import json
 import logging
@@ -9,7 +10,7 @@ import re
 import regex
 import sys
 import toml
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from tqdm import tqdm
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -298,6 +299,9 @@ class QdrantVectorStoreManager:
         qdrant.client.close()
 
 
+CITATION_PATTERN = re.compile(r"\[(\d+)\]")
+
+
 class ArticleTextProcessing:
     @staticmethod
     def limit_word_count_preserve_newline(input_string, max_word_count):
@@ -443,8 +447,10 @@ class ArticleTextProcessing:
             except Exception as e:
                 max_ref_num = 0
             if max_ref_num > len(turn.search_results):
-                for i in range(len(turn.search_results), max_ref_num + 1):
-                    turn.agent_utterance = turn.agent_utterance.replace(f"[{i}]", "")
+                num_results = len(turn.search_results)
+                turn.agent_utterance = ArticleTextProcessing.render_citations(
+                    turn.agent_utterance, lambda n: "" if n >= num_results else None
+                )
             turn.agent_utterance = (
                 ArticleTextProcessing.remove_uncompleted_sentences_with_citations(
                     turn.agent_utterance
@@ -538,16 +544,74 @@ class ArticleTextProcessing:
         return "\n\n".join(output_paragraphs)
 
     @staticmethod
-    def update_citation_index(s, citation_map):
-        """Update citation index in the string based on the citation map."""
-        for original_citation in citation_map:
-            s = s.replace(
-                f"[{original_citation}]", f"__PLACEHOLDER_{original_citation}__"
+    def render_citations(s: str, render: Callable[[int], Optional[str]]) -> str:
+        """
+        Rewrite every citation marker [n] of a string in a single pass.
+
+        Markers are matched once in the original string, so a replacement is never matched again
+        (e.g. [1] inside an emitted [[1]](url)) and [1] never matches part of [11].
+
+        Args:
+            s (str): The string containing citations in the format [number].
+            render (Callable[[int], Optional[str]]): Returns the replacement of the marker with the given index,
+                or None to keep the marker unchanged.
+
+        Returns:
+            str: The string with the citation markers rewritten.
+        """
+
+        def replace(match):
+            replacement = render(int(match.group(1)))
+            return match.group(0) if replacement is None else replacement
+
+        return CITATION_PATTERN.sub(replace, s)
+
+    @staticmethod
+    def render_citation_links(s: str, index_to_url: Dict[int, str], style: str = "markdown") -> str:
+        """
+        Turn citation markers into links to their sources.
+
+        Args:
+            s (str): The string containing citations in the format [number].
+            index_to_url (Dict[int, str]): Source url of each citation index. Markers of other indices are kept.
+            style (str): "markdown" for [[n]](url), "html" for <a href="url">[n]</a>, or "footnote" for [^n]
+                with a footnote definition per cited source appended to the string.
+
+        Returns:
+            str: The string with the citation markers rendered as links.
+        """
+        if style == "markdown":
+            render = lambda n: f"[[{n}]]({index_to_url[n]})" if n in index_to_url else None
+        elif style == "html":
+            render = (
+                lambda n: f'<a href="{html.escape(index_to_url[n], quote=True)}">[{n}]</a>'
+                if n in index_to_url
+                else None
             )
-        for original_citation, unify_citation in citation_map.items():
-            s = s.replace(f"__PLACEHOLDER_{original_citation}__", f"[{unify_citation}]")
+        elif style == "footnote":
+            cited = {}
 
-        return s
+            def render(n):
+                if n not in index_to_url:
+                    return None
+                cited[n] = index_to_url[n]
+                return f"[^{n}]"
+
+        else:
+            raise ValueError(f"Unknown citation style: {style}")
+
+        rendered = ArticleTextProcessing.render_citations(s, render)
+        if style == "footnote" and cited:
+            rendered += "\n\n" + "\n".join(f"[^{n}]: {url}" for n, url in sorted(cited.items()))
+        return rendered
+
+    @staticmethod
+    def update_citation_index(s, citation_map):
+        """Update citation index in the string based on the citation map."""
+        return ArticleTextProcessing.render_citations(
+            s,
+            lambda n: f"[{citation_map[n]}]" if n in citation_map else None,
+        )
 
     @staticmethod
     def parse_article_into_dict(input_string):
@@ -600,6 +664,16 @@ class FileIOHelper:
         with open(file_name, "w", encoding=encoding) as fw:
             json.dump(obj, fw, default=FileIOHelper.handle_non_serializable)
 
+    @staticmethod
+    def dump_json_atomic(obj, file_name, encoding="utf-8"):
+        """Dump json so readers only ever see the previous or the complete new file."""
+        tmp_file_name = f"{file_name}.tmp"
+        with open(tmp_file_name, "w", encoding=encoding) as fw:
+            json.dump(obj, fw, default=FileIOHelper.handle_non_serializable)
+            fw.flush()
+            os.fsync(fw.fileno())
+        os.replace(tmp_file_name, file_name)
+
     @staticmethod
     def handle_non_serializable(obj):
         return "non-serializable contents"  # mark the non-serializable part
@@ -630,6 +704,35 @@ class FileIOHelper:
             return pickle.load(f)
 
 
+class ArtifactWriter:
+    """Writes artifacts on a background thread, in the order they were submitted.
+
+    A single thread keeps writes ordered, so a checkpoint submitted after a stage's artifacts
+    is only written once those artifacts are on disk.
+    """
+
+    def __init__(self):
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="storm-artifacts"
+        )
+
+    def submit(self, func, *args, **kwargs) -> concurrent.futures.Future:
+        return self._pool.submit(func, *args, **kwargs)
+
+    def barrier(self, futures: List[concurrent.futures.Future]) -> concurrent.futures.Future:
+        """A future that completes once all `futures` are done, failing with the first error."""
+
+        def check():
+            for future in futures:
+                future.result()
+
+        return self._pool.submit(check)
+
+
+# Shared by all runners; artifact writes are small, so one thread keeps up with concurrent jobs.
+artifact_writer = ArtifactWriter()
+
+
 class WebPageHelper:
     """Helper class to process web pages.
 
@@ -1,23 +1,168 @@
 # backend/logger.py
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
 from pathlib import Path
 
 # Create logs directory if it doesn't exist
 logs_dir = Path("logs")
 logs_dir.mkdir(exist_ok=True)
 
+# Job and report the current code runs on behalf of, attached to every record
+_log_context: contextvars.ContextVar = contextvars.ContextVar("storm_log_context", default={})
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Attach fields such as `job_id` and `report_id` to the records logged inside the block."""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+class ContextFilter(logging.Filter):
+    """Copies the current log context onto each record (fields passed in `extra` win)."""
+
+    def filter(self, record):
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Rate limits and samples chatty call sites.
+
+    Records below WARNING are limited per call site (logger and source line) by a token bucket
+    of `burst` records refilled at `rate` records per second. Once a call site is over its
+    limit, only every `sample_every`-th record is kept (none if 0), and the next record let
+    through reports how many were suppressed. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate: float, burst: int, sample_every: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.sample_every = sample_every
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            # [tokens, last refill, records suppressed since the last one let through]
+            bucket = self._buckets.setdefault(key, [self.burst, now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+            elif self.sample_every and (bucket[2] + 1) % self.sample_every == 0:
+                pass  # Sampled while over the limit
+            else:
+                bucket[2] += 1
+                return False
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message merged, leaving all formatting to the listener."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames that cannot cross to the listener safely; keep their text
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the job and report IDs of the record if it has them."""
+
+    FIELDS = ("job_id", "report_id", "suppressed")
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """The plain text format, with the record's report ID and suppressed count if it has them."""
+
+    def format(self, record):
+        report_id = getattr(record, "report_id", None)
+        suppressed = getattr(record, "suppressed", None)
+        if report_id is not None or suppressed:
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+            if report_id is not None:
+                record.msg = f"[{report_id}] {record.msg}"
+            if suppressed:
+                record.msg += f" ({suppressed} similar messages suppressed)"
+        return super().format(record)
+
 def setup_logging():
-    """Configure logging for the entire application."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            # File handler for general application logs
-            logging.FileHandler(logs_dir / 'api.log'),
-            # Stream handler for console output
-            logging.StreamHandler()
-        ]
+    """Configure logging for the entire application.
+
+    Loggers only put records on an in-memory queue; a listener thread formats them and writes
+    them to the console and `logs/api.log`, so logging from the event loop never waits on I/O.
+    STORM_LOG_FORMAT selects "text" or "json" output, and STORM_LOG_RATE, STORM_LOG_BURST and
+    STORM_LOG_SAMPLE_EVERY configure the RateLimitFilter.
+    """
+    if os.getenv("STORM_LOG_FORMAT", "text") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # File handler for general application logs
+    file_handler = logging.FileHandler(logs_dir / 'api.log')
+    # Stream handler for console output
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(
+        rate=float(os.getenv("STORM_LOG_RATE", "20")),
+        burst=int(os.getenv("STORM_LOG_BURST", "100")),
+        sample_every=int(os.getenv("STORM_LOG_SAMPLE_EVERY", "100")),
+    ))
+    queue_handler.addFilter(ContextFilter())
+
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
     )
+    listener.start()
+    # Flush the records still queued when the process exits
+    atexit.register(listener.stop)
+
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
 
     # Suppress verbose fontTools logging
     logging.getLogger('fontTools').setLevel(logging.WARNING)
@@ -27,4 +172,4 @@ def setup_logging():
     return logging.getLogger("knowledge_storm")
 
 # Create and configure the shared logger
-logger = setup_logging()
\ No newline at end of file
+logger = setup_logging()
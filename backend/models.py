@@ -5,6 +5,7 @@ class ArticleCreate(BaseModel):
     topic: str
     report_id: str  # Add this to identify the report for WebSocket updates
     report_language: str
+    priority: int = 0  # Higher priority jobs are dispatched first
 
 
 class ArticleResponse(BaseModel):
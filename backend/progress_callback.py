@@ -0,0 +1,218 @@
+# progress_callback.py
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .knowledge_storm.storm_wiki.modules.callback import BaseCallbackHandler
+from .logger import logger
+
+
+class WebSocketCallbackHandler(BaseCallbackHandler):
+    """Forwards STORM pipeline callbacks to the report's WebSocket clients as `progress` events.
+
+    Callbacks fire on the job's worker thread and on the modules' own thread pools, so counters
+    are guarded by a lock and every update is marshalled onto the event loop with
+    `JobExecutor.post`. Each event names its stage ("research", "outline", "article" or
+    "polish"), whether the stage started, progressed or finished, the seconds elapsed in that
+    stage, and counts the frontend can turn into a progress bar. Stage durations are also
+    logged and kept in `stage_durations`.
+
+    The article is also delivered while it is written: a `section_ready` event carries each
+    section (with the references it cites) as soon as it is done, `section_order` gives the
+    order of the first-level sections once all are written, and `lead_ready` carries the lead
+    section written while polishing. Citation numbers in these events follow the draft; the
+    `completed` event carries the final numbering.
+
+    With streaming LMs, text is forwarded while it is generated as `section_delta` and
+    `polish_delta` events. Deltas are buffered per section (or polished part) and flushed every
+    `STREAM_FLUSH_CHARS` characters or `STREAM_FLUSH_SECONDS` seconds, whichever comes first, so a
+    token stream does not turn into one WebSocket message per token.
+    """
+
+    STREAM_FLUSH_CHARS = 200
+    STREAM_FLUSH_SECONDS = 0.25
+
+    def __init__(self, report_id: str, manager, executor, max_conv_turn: Optional[int] = None):
+        """
+        Args:
+            report_id: Report the events are addressed to.
+            manager: ConnectionManager (or fan-out) whose `send_update` delivers the events.
+            executor: JobExecutor that owns the event loop.
+            max_conv_turn: Maximum turns per research conversation, used to estimate the total.
+        """
+        self.report_id = report_id
+        self.manager = manager
+        self.executor = executor
+        self.max_conv_turn = max_conv_turn
+        self.stage_durations: Dict[str, float] = {}
+
+        self._lock = threading.Lock()
+        self._stage_started: Dict[str, float] = {}
+        self._completed_turns = 0
+        self._expected_turns: Optional[int] = None
+        self._completed_sections = 0
+        self._expected_sections: Optional[int] = None
+        # (event, key field, key) -> [buffered text, time of the last flush]
+        self._stream_buffers: Dict[tuple, list] = {}
+
+    def _post(self, update: dict):
+        self.executor.post(self.manager.send_update(self.report_id, {"report_id": self.report_id, **update}))
+
+    def _send(self, stage: str, status: str, message: str, **data):
+        started = self._stage_started.get(stage)
+        elapsed = time.monotonic() - started if started is not None else 0.0
+        self._post({
+            "event": "progress",
+            "stage": stage,
+            "status": status,
+            "message": message,
+            "elapsed_seconds": round(elapsed, 2),
+            **data,
+        })
+
+    def _stream(self, event: str, key_field: str, key: str, delta: str):
+        now = time.monotonic()
+        with self._lock:
+            buffer = self._stream_buffers.setdefault((event, key_field, key), ["", now])
+            buffer[0] += delta
+            if len(buffer[0]) < self.STREAM_FLUSH_CHARS and now - buffer[1] < self.STREAM_FLUSH_SECONDS:
+                return
+            text, buffer[0], buffer[1] = buffer[0], "", now
+        self._post({"event": event, key_field: key, "data": {"delta": text}})
+
+    def _flush_stream(self, event: str, key_field: str, key: str):
+        with self._lock:
+            buffer = self._stream_buffers.pop((event, key_field, key), None)
+        if buffer is not None and buffer[0]:
+            self._post({"event": event, key_field: key, "data": {"delta": buffer[0]}})
+
+    def _start_stage(self, stage: str, message: str, **data):
+        with self._lock:
+            self._stage_started[stage] = time.monotonic()
+        self._send(stage, "started", message, **data)
+
+    def _end_stage(self, stage: str, message: str, **data):
+        with self._lock:
+            started = self._stage_started.get(stage)
+            if started is not None:
+                self.stage_durations[stage] = time.monotonic() - started
+        if stage in self.stage_durations:
+            logger.info(f"Report {self.report_id} finished {stage} in {self.stage_durations[stage]:.2f} seconds")
+        self._send(stage, "finished", message, **data)
+
+    def on_identify_perspective_start(self, **kwargs):
+        self._start_stage("research", "Identifying perspectives")
+
+    def on_identify_perspective_end(self, perspectives: List[str], **kwargs):
+        with self._lock:
+            if self.max_conv_turn is not None:
+                self._expected_turns = len(perspectives) * self.max_conv_turn
+        self._send(
+            "research",
+            "progress",
+            f"Identified {len(perspectives)} perspectives",
+            perspectives=perspectives,
+        )
+
+    def on_information_gathering_start(self, **kwargs):
+        self._send(
+            "research",
+            "progress",
+            "Researching the topic",
+            completed_turns=0,
+            expected_turns=self._expected_turns,
+        )
+
+    def on_dialogue_turn_end(self, dlg_turn, **kwargs):
+        with self._lock:
+            self._completed_turns += 1
+            completed_turns = self._completed_turns
+        self._send(
+            "research",
+            "progress",
+            f"Completed research turn {completed_turns}",
+            completed_turns=completed_turns,
+            expected_turns=self._expected_turns,
+            search_queries=len(dlg_turn.search_queries or []),
+            search_results=len(dlg_turn.search_results or []),
+        )
+
+    def on_information_gathering_end(self, **kwargs):
+        self._end_stage(
+            "research",
+            "Research completed",
+            completed_turns=self._completed_turns,
+        )
+
+    def on_information_organization_start(self, **kwargs):
+        self._start_stage("outline", "Organizing collected information into an outline")
+
+    def on_direct_outline_generation_end(self, outline: str, **kwargs):
+        self._send("outline", "progress", "Drafted an outline")
+
+    def on_outline_refinement_end(self, outline: str, **kwargs):
+        headings = sum(1 for line in outline.splitlines() if line.startswith("#"))
+        self._end_stage("outline", "Outline completed", headings=headings)
+
+    def on_article_generation_start(self, sections: List[str], **kwargs):
+        with self._lock:
+            self._completed_sections = 0
+            self._expected_sections = len(sections)
+        self._start_stage(
+            "article",
+            f"Writing {len(sections)} sections",
+            completed_sections=0,
+            expected_sections=len(sections),
+        )
+
+    def on_section_delta(self, section_name: str, delta: str, **kwargs):
+        self._stream("section_delta", "section_name", section_name, delta)
+
+    def on_section_generation_end(self, section_name: str, section_content: str, references: dict, **kwargs):
+        self._flush_stream("section_delta", "section_name", section_name)
+        with self._lock:
+            self._completed_sections += 1
+            completed_sections = self._completed_sections
+        self._post({
+            "event": "section_ready",
+            "message": f"Section ready: {section_name}",
+            "section_name": section_name,
+            "data": {"content": section_content, "references": references},
+        })
+        self._send(
+            "article",
+            "progress",
+            f"Wrote section: {section_name}",
+            section_name=section_name,
+            completed_sections=completed_sections,
+            expected_sections=self._expected_sections,
+        )
+
+    def on_article_generation_end(self, section_order: List[str], **kwargs):
+        self._post({
+            "event": "section_order",
+            "message": "All sections written",
+            "data": {"sections": section_order},
+        })
+        self._end_stage(
+            "article",
+            "Article draft completed",
+            completed_sections=self._completed_sections,
+        )
+
+    def on_article_polishing_start(self, **kwargs):
+        self._start_stage("polish", "Polishing the article")
+
+    def on_polishing_delta(self, part: str, delta: str, **kwargs):
+        self._stream("polish_delta", "part", part, delta)
+
+    def on_article_polishing_end(self, lead_section: str, **kwargs):
+        for part in ("lead_section", "page"):
+            self._flush_stream("polish_delta", "part", part)
+        if lead_section:
+            self._post({
+                "event": "lead_ready",
+                "message": "Lead section ready",
+                "data": {"content": lead_section},
+            })
+        self._end_stage("polish", "Polishing completed")
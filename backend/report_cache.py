@@ -0,0 +1,174 @@
+# report_cache.py
+import glob
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from .logger import logger
+
+REPORT_META_FILE = "report_meta.json"
+
+
+class ReportCache:
+    """Cache of finished reports keyed by job key (normalized topic + language + config hash).
+
+    Finished artifact directories are indexed by the same key used to coalesce in-flight jobs,
+    so a repeat request is answered from disk in milliseconds instead of re-running STORM, and
+    any change to the runner configuration changes the key and therefore misses the cache.
+
+    Entries expire `ttl_seconds` after the report was generated. The index is bounded to
+    `max_entries` (least recently used entries are dropped), and the decoded `completed`
+    payloads kept in memory are bounded to `max_bytes`; an entry whose payload was evicted is
+    re-read from its artifact directory on the next hit. Each indexed directory carries a
+    `report_meta.json`, so the index is rebuilt from disk on startup.
+    """
+
+    def __init__(
+        self,
+        storage_path: str,
+        loader: Callable[[str], dict],
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        """
+        Args:
+            storage_path: Directory containing one artifact directory per report.
+            loader: Builds the `completed` payload from an artifact directory.
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("STORM_REPORT_CACHE_TTL", str(24 * 60 * 60)))
+        if max_entries is None:
+            max_entries = int(os.getenv("STORM_REPORT_CACHE_MAX_ENTRIES", "256"))
+        if max_bytes is None:
+            max_bytes = int(os.getenv("STORM_REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.storage_path = storage_path
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(0, max_bytes)
+
+        self._index: "OrderedDict[str, dict]" = OrderedDict()
+        self._payloads: "OrderedDict[str, tuple]" = OrderedDict()
+        self._payload_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Rebuild the index from the metadata files of existing artifact directories."""
+        entries = []
+        for meta_file in glob.glob(os.path.join(self.storage_path, "*", REPORT_META_FILE)):
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["article_dir"] = os.path.dirname(meta_file)
+                entries.append(meta)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable report metadata {meta_file}: {str(e)}")
+        entries.sort(key=lambda meta: meta.get("completed_at", 0))
+        with self._lock:
+            for meta in entries:
+                if not self._is_expired(meta):
+                    self._index[meta["job_key"]] = meta
+                    self._index.move_to_end(meta["job_key"])
+            self._evict_entries()
+        logger.info(f"Report cache loaded {len(self._index)} entries from {self.storage_path}")
+
+    def put(self, key: str, article_dir: str, topic: str, report_language: str):
+        """Index a finished report and record its metadata next to the artifacts."""
+        meta = {
+            "job_key": key,
+            "topic": topic,
+            "report_language": report_language,
+            "completed_at": time.time(),
+        }
+        meta_file = os.path.join(article_dir, REPORT_META_FILE)
+        tmp_file = f"{meta_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, meta_file)
+
+        with self._lock:
+            self._drop_payload(key)
+            self._index[key] = {**meta, "article_dir": article_dir}
+            self._index.move_to_end(key)
+            self._evict_entries()
+        logger.info(f"Cached report for topic: {topic} in language: {report_language}")
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Metadata (including `article_dir`) of a fresh cached report, or None."""
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                return None
+            if self._is_expired(meta) or not os.path.isdir(meta["article_dir"]):
+                self._index.pop(key, None)
+                self._drop_payload(key)
+                return None
+            self._index.move_to_end(key)
+            return dict(meta)
+
+    def get(self, key: str) -> Optional[Tuple[dict, dict]]:
+        """The metadata and `completed` payload of a fresh cached report, or None on a miss.
+
+        A payload that is not in memory is rebuilt from its artifact directory, which reads and
+        parses the whole report; call this from a worker thread, not the event loop.
+        """
+        meta = self.lookup(key)
+        if meta is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            cached = self._payloads.get(key)
+            if cached is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return meta, cached[0]
+
+        try:
+            payload = self.loader(meta["article_dir"])
+        except Exception as e:
+            logger.warning(f"Could not load cached report from {meta['article_dir']}: {str(e)}")
+            with self._lock:
+                self._index.pop(key, None)
+                self.misses += 1
+            return None
+
+        size = len(json.dumps(payload))
+        with self._lock:
+            # Another thread may have loaded the same payload meanwhile
+            self._drop_payload(key)
+            if size <= self.max_bytes:
+                self._payloads[key] = (payload, size)
+                self._payload_bytes += size
+                while self._payload_bytes > self.max_bytes:
+                    self._drop_payload(next(iter(self._payloads)))
+            self.hits += 1
+        return meta, payload
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "payload_bytes": self._payload_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _is_expired(self, meta: dict) -> bool:
+        return time.time() - meta.get("completed_at", 0) > self.ttl_seconds
+
+    def _drop_payload(self, key: str):
+        cached = self._payloads.pop(key, None)
+        if cached is not None:
+            self._payload_bytes -= cached[1]
+
+    def _evict_entries(self):
+        while len(self._index) > self.max_entries:
+            key, _ = self._index.popitem(last=False)
+            self._drop_payload(key)
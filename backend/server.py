@@ -3,18 +3,35 @@ import json
 import os
 import sys
 import traceback
+from typing import Dict
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 
 from .websocket_manager import ConnectionManager
+from .job_executor import JobExecutor
+from .job_queue import JobExistsError, JobQueue, QueueFullError
+from .report_cache import ReportCache
+from .knowledge_storm import STORMWikiRunner
+from .knowledge_storm.interface import CancellationToken
+from .knowledge_storm.transport import transport_stats
 from .models import ArticleCreate
-from .logger import logger
+from .logger import logger, log_context
 from .server_utils import (
-    initialize_storm_runner,
+    initialize_runner_factory,
     generate_article_in_background,
+    new_article_dir,
+    job_key,
+    JobEventFanout,
+    load_report_payload,
+    load_reference,
+    reference_details,
+    reference_snippets,
+    find_article_dir,
+    artifact_response,
+    STORAGE_PATH,
 )
 
 sys.path.append('../../')
@@ -22,6 +39,21 @@ sys.path.append('../../')
 # Initialize connection manager for WebSockets
 manager = ConnectionManager()
 
+# Worker pool that runs the blocking STORM pipeline off the event loop
+executor = JobExecutor()
+
+# Durable job queue; admits at most STORM_MAX_CONCURRENT_JOBS running reports at a time
+job_queue = JobQueue(max_concurrency=int(os.getenv("STORM_MAX_CONCURRENT_JOBS", executor.max_workers)))
+
+# Finished reports, answered instantly for repeat requests with the same topic, language and config
+report_cache = ReportCache(STORAGE_PATH, loader=load_report_payload)
+
+# Cancellation tokens of the running jobs, keyed by leader report_id
+cancel_tokens: Dict[str, CancellationToken] = {}
+
+# Event fanouts of the running jobs, keyed by leader report_id
+job_fanouts: Dict[str, JobEventFanout] = {}
+
 app = FastAPI()
 
 # Enable CORS
@@ -33,8 +65,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize STORM runner
-runner = initialize_storm_runner()
+# Initialize STORM runner factory; every job gets its own isolated runner
+runner_factory = initialize_runner_factory()
+
+async def run_queued_job(job: dict) -> bool:
+    """Run one job dispatched by the queue on behalf of every report coalesced into it."""
+    report_id = job["report_id"]
+    # Jobs that were interrupted or failed resume in their existing artifact directory
+    resume = bool(job["article_dir"]) and os.path.isdir(job["article_dir"])
+    article_dir = job["article_dir"] if resume else new_article_dir(report_id)
+    job_queue.set_article_dir(report_id, article_dir)
+    cancel_tokens[report_id] = CancellationToken()
+    job_fanouts[report_id] = JobEventFanout(manager, report_id, lambda: job_queue.subscribers(report_id))
+    try:
+        with log_context(job_id=report_id, report_id=report_id):
+            succeeded = await generate_article_in_background(
+                report_id=report_id,
+                topic=job["topic"],
+                report_language=job["report_language"],
+                runner_factory=runner_factory,
+                manager=job_fanouts[report_id],
+                executor=executor,
+                article_dir=article_dir,
+                resume=resume,
+                cancel_token=cancel_tokens[report_id],
+                on_finished=lambda: job_queue.mark_completed(report_id)
+            )
+    finally:
+        cancel_tokens.pop(report_id, None)
+        job_fanouts.pop(report_id, None)
+    if succeeded and job["job_key"] is not None:
+        report_cache.put(job["job_key"], article_dir, job["topic"], job["report_language"])
+    return succeeded
+
+@app.on_event("startup")
+async def start_job_queue():
+    report_cache.load()
+    await job_queue.start(run_queued_job, manager)
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    await job_queue.stop()
+    executor.shutdown(wait=False)
 
 # Add global exception handlers to ensure all errors return JSON
 @app.exception_handler(Exception)
@@ -54,36 +126,98 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": f"Validation error: {str(exc)}"}
     )
 
+def duplicate_job_response(error: JobExistsError) -> JSONResponse:
+    """409 for a submission whose report_id is still in flight, with that job's status."""
+    logger.warning(f"Rejected duplicate submission: {str(error)}")
+    return JSONResponse(
+        status_code=409,  # Conflict
+        content={"detail": str(error), "status": error.status, "queue_position": error.position}
+    )
+
 @app.post("/api/articles")
-async def create_article(article_create: ArticleCreate, background_tasks: BackgroundTasks):
+async def create_article(article_create: ArticleCreate):
     try:
         logger.info(f"Received article creation request for topic: {article_create.topic} in language: {article_create.report_language}")
         report_id = article_create.report_id
         
-        # Add a small delay to allow WebSocket connection to be established
-        await asyncio.sleep(1)
+        # Requests that would produce the same report share a key
+        key = None
+        if runner_factory is not None:
+            key = job_key(article_create.topic, article_create.report_language, runner_factory.config_fingerprint())
+        
+        # Repeat requests for a fresh finished report are answered from the cache; a payload that
+        # is not in memory is rebuilt from disk off the event loop
+        cached = await asyncio.to_thread(report_cache.get, key) if key is not None else None
+        if cached is not None:
+            cached_meta, cached_payload = cached
+            logger.info(f"Serving report {report_id} from cache")
+            try:
+                job_queue.record_completed(
+                    report_id=report_id,
+                    topic=article_create.topic,
+                    report_language=article_create.report_language,
+                    article_dir=cached_meta["article_dir"],
+                    job_key=key
+                )
+            except JobExistsError as e:
+                return duplicate_job_response(e)
+            await manager.send_update(report_id, {
+                "event": "completed",
+                "report_id": report_id,
+                "message": "Report generation completed",
+                "cached": True,
+                "data": cached_payload
+            })
+            return JSONResponse(
+                status_code=200,
+                content={"detail": "Report served from cache"}
+            )
+        
+        # Admit the job into the queue; identical in-flight requests are coalesced into one job
+        # and new jobs are rejected with 429 when the queue is full
+        try:
+            position = job_queue.enqueue(
+                report_id=report_id,
+                topic=article_create.topic,
+                report_language=article_create.report_language,
+                priority=article_create.priority,
+                job_key=key
+            )
+        except JobExistsError as e:
+            return duplicate_job_response(e)
+        except QueueFullError as e:
+            logger.warning(f"Rejected report {report_id}: {str(e)}")
+            await manager.send_update(report_id, {
+                "event": "error",
+                "report_id": report_id,
+                "message": f"Report generation is busy, please try again later: {str(e)}",
+                "should_delete": True  # Signal to delete the placeholder
+            })
+            await manager.cleanup_connections_for_report(report_id)
+            return JSONResponse(
+                status_code=429,  # Too Many Requests
+                content={"detail": str(e)},
+                headers={"Retry-After": "60"}
+            )
         
         # Send initial processing status
+        leader_id = job_queue.leader_of(report_id)
         await manager.send_update(report_id, {
             "event": "processing_started",
             "report_id": report_id,
-            "message": "Starting report generation"
+            "message": "Starting report generation" if leader_id is None else "Joined an identical report already in progress",
+            "queue_position": position,
+            "coalesced": leader_id is not None
         })
         
-        # Schedule the background task
-        background_tasks.add_task(
-            generate_article_in_background,
-            report_id=report_id,
-            topic=article_create.topic,
-            report_language=article_create.report_language,
-            runner=runner,
-            manager=manager
-        )
+        # A report joining a running job is first sent what the job has published so far
+        if leader_id is not None and leader_id in job_fanouts:
+            await job_fanouts[leader_id].attach(report_id)
         
         # Return immediately
         return JSONResponse(
             status_code=202,  # Accepted
-            content={"detail": "Report generation started in background"}
+            content={"detail": "Report generation queued", "queue_position": position}
         )
             
     except Exception as e:
@@ -102,19 +236,123 @@ async def create_article(article_create: ArticleCreate, background_tasks: Backgr
             content={"detail": f"Error initiating article creation: {str(e)}"}
         )
 
+def finished_article_dir(report_id: str) -> str:
+    """Artifact directory of a finished report, or an HTTP error if there is nothing to serve yet."""
+    job = job_queue.get(report_id)
+    if job is not None and job["status"] in ("queued", "running", "coalesced"):
+        raise HTTPException(status_code=409, detail=f"Report {report_id} is still being generated")
+    article_dir = find_article_dir(report_id, job)
+    if article_dir is None and job is not None and job["leader_id"] is not None:
+        # Coalesced reports share the artifacts of the job they followed
+        article_dir = find_article_dir(job["leader_id"], job_queue.get(job["leader_id"]))
+    if article_dir is None or not os.path.exists(os.path.join(article_dir, "storm_gen_article_polished.txt")):
+        raise HTTPException(status_code=404, detail=f"Report {report_id} not found")
+    return article_dir
+
+def read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+@app.get("/api/articles/{report_id}")
+async def get_article(report_id: str, request: Request):
+    """Fetch a finished report; supports ETag revalidation, compression and byte ranges."""
+    article_dir = finished_article_dir(report_id)
+    payload = await asyncio.to_thread(load_report_payload, article_dir)
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return artifact_response(request, body, "application/json")
+
+@app.get("/api/articles/{report_id}/references")
+async def get_article_references(report_id: str, request: Request):
+    """Fetch the references (url_to_info.json, numbered like the polished article) of a finished report."""
+    article_dir = finished_article_dir(report_id)
+    references_file = STORMWikiRunner.references_path(article_dir)
+    if not os.path.exists(references_file):
+        raise HTTPException(status_code=404, detail=f"References for report {report_id} not found")
+    body = await asyncio.to_thread(read_bytes, references_file)
+    return artifact_response(request, body, "application/json")
+
+async def find_reference(report_id: str, index: int) -> dict:
+    """Full details of a cited source of a finished report, or an HTTP 404."""
+    article_dir = finished_article_dir(report_id)
+    try:
+        reference = await asyncio.to_thread(load_reference, article_dir, index)
+    except FileNotFoundError:
+        reference = None
+    if reference is None:
+        raise HTTPException(status_code=404, detail=f"Reference {index} of report {report_id} not found")
+    return reference
+
+@app.get("/api/articles/{report_id}/references/{index}")
+async def get_article_reference(report_id: str, index: int, request: Request):
+    """Fetch the details of one cited source; its snippets are served by the snippets endpoint."""
+    reference = reference_details(await find_reference(report_id, index))
+    body = json.dumps(reference, ensure_ascii=False).encode("utf-8")
+    return artifact_response(request, body, "application/json")
+
+@app.get("/api/articles/{report_id}/references/{index}/snippets")
+async def get_article_reference_snippets(report_id: str, index: int, request: Request, offset: int = 0, limit: int = 5):
+    """Fetch a page of the snippets collected for one cited source."""
+    if offset < 0 or not 1 <= limit <= 50:
+        raise HTTPException(status_code=422, detail="offset must be >= 0 and limit between 1 and 50")
+    page = reference_snippets(await find_reference(report_id, index), offset, limit)
+    body = json.dumps(page, ensure_ascii=False).encode("utf-8")
+    return artifact_response(request, body, "application/json")
+
+@app.post("/api/articles/{report_id}/resume")
+async def resume_article(report_id: str):
+    """Requeue a failed report; it restarts from its last completed stage."""
+    job = job_queue.get(report_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Report {report_id} not found")
+    if job["leader_id"] is not None:
+        report_id = job["leader_id"]
+        job = job_queue.get(report_id)
+    if job["status"] != "failed":
+        raise HTTPException(status_code=409, detail=f"Report {report_id} is {job['status']} and cannot be resumed")
+    position = job_queue.requeue(report_id)
+    return JSONResponse(
+        status_code=202,  # Accepted
+        content={"detail": "Report generation resumed", "queue_position": position}
+    )
+
+@app.delete("/api/articles/{report_id}")
+async def cancel_article(report_id: str):
+    """Cancel a queued or running report; its run stops once no other client is waiting for it."""
+    job = job_queue.get(report_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Report {report_id} not found")
+    if job["status"] not in ("queued", "running", "coalesced"):
+        raise HTTPException(status_code=409, detail=f"Report {report_id} is {job['status']} and cannot be cancelled")
+    
+    stop_id = job_queue.cancel(report_id)
+    if stop_id is not None and stop_id in cancel_tokens:
+        logger.info(f"Stopping running job {stop_id}")
+        cancel_tokens[stop_id].cancel("cancelled")
+    
+    await manager.send_update(report_id, {
+        "event": "cancelled",
+        "report_id": report_id,
+        "message": "Report generation cancelled",
+        "should_delete": True
+    })
+    await manager.cleanup_connections_for_report(report_id)
+    return JSONResponse(
+        status_code=200,
+        content={"detail": "Report generation cancelled"}
+    )
+
 @app.websocket("/ws/reports/{report_id}")
-async def websocket_endpoint(websocket: WebSocket, report_id: str):
-    logger.info(f"Received WebSocket connection request for report {report_id}")
-    connection_id = await manager.connect(websocket, report_id)
-    logger.info(f"WebSocket connected for report {report_id} with connection_id {connection_id}")
+async def websocket_endpoint(websocket: WebSocket, report_id: str, since: int = 0, protocol: str = "json"):
+    """Stream a report's events; reconnecting clients pass the last `seq` they received as `since`.
 
+    `protocol=compact` selects compressed binary frames (see `websocket_manager.PROTOCOLS`).
+    """
+    logger.info(f"Received WebSocket connection request for report {report_id}")
+    connection_id = None
     try:
-        # Send initial connection confirmation
-        await websocket.send_json({
-            "event": "connected",
-            "report_id": report_id,
-            "message": "WebSocket connected successfully"
-        })
+        # Confirms the connection and replays the events logged after `since`
+        connection_id = await manager.connect(websocket, report_id, since=since, protocol=protocol)
+        logger.info(f"WebSocket connected for report {report_id} with connection_id {connection_id}")
         
         # Keep connection alive until client disconnects
         while True:
@@ -124,7 +362,7 @@ async def websocket_endpoint(websocket: WebSocket, report_id: str):
             
             # Handle ping with pong to keep connection alive
             if msg.get("type") == "ping":
-                await websocket.send_json({"type": "pong", "timestamp": msg.get("timestamp")})
+                await manager.send_to_connection(connection_id, {"type": "pong", "timestamp": msg.get("timestamp")})
                 
     except WebSocketDisconnect:
         await manager.disconnect(websocket, connection_id)
@@ -154,5 +392,12 @@ async def health_check():
     return {
         "status": "ok", 
         "message": "FastAPI server is running",
-        "storm_runner_initialized": runner is not None
+        "storm_runner_initialized": runner_factory is not None,
+        "active_jobs": executor.active_jobs,
+        "max_workers": executor.max_workers,
+        "queued_jobs": job_queue.queued_count(),
+        "max_concurrent_jobs": job_queue.max_concurrency,
+        "report_cache": report_cache.stats(),
+        "websockets": manager.stats(),
+        "search": transport_stats()
     }
\ No newline at end of file
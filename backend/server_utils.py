@@ -1,35 +1,62 @@
 import asyncio
+import glob
+import gzip
+import hashlib
 import json
 import os
 import re
 import traceback
 from datetime import datetime
+from typing import Callable, List, Optional
+
+from fastapi import Request, Response
 
 from .logger import logger
+from .progress_callback import WebSocketCallbackHandler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Add this near the top with other imports
-from openai import APITimeoutError, RateLimitError, APIError
+from openai import APITimeoutError, RateLimitError, APIError, AzureOpenAI
 
 from .knowledge_storm import (
     STORMWikiRunnerArguments,
     STORMWikiRunner,
     STORMWikiLMConfigs,
 )
+from .knowledge_storm.interface import CancellationToken, Deadline, JobCancelledError
+from .knowledge_storm.utils import ArticleTextProcessing
 from .knowledge_storm.lm import AzureOpenAIModel
-from .knowledge_storm.rm import SerperRM
+from .knowledge_storm.rm import CachedRM, SerperBatcher, SerperRM
+from .knowledge_storm.transport import get_transport, set_blocking_workers
 
 # Data storage path
 STORAGE_PATH = "articles"
 os.makedirs(STORAGE_PATH, exist_ok=True)
 
-# Initialize STORM runner
-def initialize_storm_runner():
-    """Initialize the STORM Wiki Runner with appropriate configurations"""
-    try:
-        # Configure STORM runner
-        llm_configs = STORMWikiLMConfigs()
+# Hard limit for one report, and the part of it kept free to write and deliver the result
+JOB_TIMEOUT = 600
+JOB_DEADLINE_MARGIN = 30
+
+# Length of the source descriptions kept in the reference index of a `completed` event
+REFERENCE_DESCRIPTION_CHARS = 200
 
-        azure_kwargs = {
+class StormRunnerFactory:
+    """Builds an isolated STORMWikiRunner for every job.
+
+    A runner carries per-job state (`args.report_language`, `topic`, `article_output_dir`), so a
+    single shared runner lets concurrent reports corrupt each other. The factory instead creates
+    a fresh runner per job while sharing the expensive, thread-safe parts: the Azure OpenAI client
+    (and its connection pool), the Serper keep-alive session and, via `StormInformationTable`, the
+    sentence embedding model.
+    Each job gets its own lightweight LM wrappers and retriever so usage accounting stays per job.
+    """
+
+    def __init__(self):
+        self.azure_kwargs = {
             "model": "gpt-4o",
             "api_key": os.getenv("AZURE_API_KEY"),
             "azure_endpoint": os.getenv("AZURE_API_BASE"),
@@ -37,54 +64,197 @@ def initialize_storm_runner():
             "temperature": 1.0,
             "top_p": 0.9,
         }
-        ModelClass = AzureOpenAIModel
-
         # Use 4o model, with max_token as parameter
-        conv_simulator_lm = ModelClass(max_tokens=500, **azure_kwargs)
-        question_asker_lm = ModelClass(max_tokens=500, **azure_kwargs)
-        outline_gen_lm = ModelClass(max_tokens=400, **azure_kwargs)
-        article_gen_lm = ModelClass(max_tokens=700, **azure_kwargs)
-        article_polish_lm = ModelClass(max_tokens=4000, **azure_kwargs)
-
-        llm_configs.set_conv_simulator_lm(conv_simulator_lm)
-        llm_configs.set_question_asker_lm(question_asker_lm)
-        llm_configs.set_outline_gen_lm(outline_gen_lm)
-        llm_configs.set_article_gen_lm(article_gen_lm)
-        llm_configs.set_article_polish_lm(article_polish_lm)
+        self.lm_max_tokens = {
+            "conv_simulator_lm": 500,
+            "question_asker_lm": 500,
+            "outline_gen_lm": 400,
+            "article_gen_lm": 700,
+            "article_polish_lm": 4000,
+        }
+        self.engine_kwargs = {
+            "max_conv_turn": 3,
+            "max_perspective": 3,
+            "search_top_k": 3,
+            "retrieve_top_k": 5,
+        }
+        # Long generations (sections, lead and polished page) stream their text to clients as it is written
+        self.streaming_lms = ("article_gen_lm", "article_polish_lm")
+        self.stream_tokens = os.getenv("STORM_STREAM_TOKENS", "false").lower() == "true"
+        self.rm_kwargs = {
+            "serper_search_api_key": os.getenv("SERPER_API_KEY"),
+            "query_params": {"autocorrect": True, "num": 10, "page": 1},
+            # Personas search concurrently; their queries are sent to Serper together
+            "batch_window": float(os.getenv("STORM_SERPER_BATCH_WINDOW", "0.05")),
+        }
+        # Every thread of every concurrent job may search at once
+        self.serper_transport = get_transport(
+            "serper",
+            max_connections=int(os.getenv("STORM_MAX_WORKERS", "2")) * STORMWikiRunnerArguments.max_thread_num,
+            rate=float(os.getenv("STORM_SERPER_RATE_LIMIT", "0")),
+        )
+        # Searches of all concurrent jobs are batched together
+        self.serper_batcher = SerperBatcher(
+            self.rm_kwargs["serper_search_api_key"],
+            self.serper_transport,
+            window=self.rm_kwargs["batch_window"],
+        )
+        # Synchronous retrievers and page fetches of all running jobs share one thread pool
+        set_blocking_workers(
+            int(os.getenv("STORM_MAX_CONCURRENT_JOBS", "2")) * STORMWikiRunnerArguments.max_thread_num
+        )
+        # Search results are cached on disk and shared by every job (a TTL of 0 disables the cache)
+        self.search_cache_ttl = float(os.getenv("STORM_SEARCH_CACHE_TTL", "604800"))
+        self.search_cache = (
+            CachedRM.open_cache(
+                os.getenv("STORM_SEARCH_CACHE_DIR", os.path.join("storage", "search_cache")),
+                size_limit=int(os.getenv("STORM_SEARCH_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+            )
+            if self.search_cache_ttl > 0
+            else None
+        )
+        self.client = AzureOpenAI(
+            azure_endpoint=self.azure_kwargs["azure_endpoint"],
+            api_key=self.azure_kwargs["api_key"],
+            api_version=self.azure_kwargs["api_version"],
+        )
+
+    def config_fingerprint(self) -> str:
+        """Stable hash of every setting that changes the generated report (secrets excluded)."""
+        config = {
+            "lm": {
+                key: value
+                for key, value in self.azure_kwargs.items()
+                if key not in ("api_key", "azure_endpoint", "api_version")
+            },
+            "lm_max_tokens": self.lm_max_tokens,
+            "engine": self.engine_kwargs,
+            "rm": self.rm_kwargs["query_params"],
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def create_runner(self, report_language: str = "English") -> STORMWikiRunner:
+        """Create a runner whose mutable state belongs to a single job."""
+        llm_configs = STORMWikiLMConfigs()
+        llm_configs.set_conv_simulator_lm(self._create_lm("conv_simulator_lm"))
+        llm_configs.set_question_asker_lm(self._create_lm("question_asker_lm"))
+        llm_configs.set_outline_gen_lm(self._create_lm("outline_gen_lm"))
+        llm_configs.set_article_gen_lm(self._create_lm("article_gen_lm"))
+        llm_configs.set_article_polish_lm(self._create_lm("article_polish_lm"))
 
         engine_args = STORMWikiRunnerArguments(
             output_dir=STORAGE_PATH,
-            max_conv_turn=3,
-            max_perspective=3,
-            search_top_k=3,
-            retrieve_top_k=5,
-            report_language="English"
+            report_language=report_language,
+            **self.engine_kwargs,
         )
 
         rm = SerperRM(
-            serper_search_api_key=os.getenv("SERPER_API_KEY"),
-            query_params={"autocorrect": True, "num": 10, "page": 1},
+            serper_search_api_key=self.rm_kwargs["serper_search_api_key"],
+            query_params=dict(self.rm_kwargs["query_params"]),
+            batch_window=self.rm_kwargs["batch_window"],
+            transport=self.serper_transport,
+            batcher=self.serper_batcher,
         )
-        runner = STORMWikiRunner(engine_args, llm_configs, rm)
-        logger.info("Successfully initialized STORM Wiki Runner")
-        return runner
+        if self.search_cache is not None:
+            rm = CachedRM(rm, self.search_cache, ttl=self.search_cache_ttl)
+        return STORMWikiRunner(engine_args, llm_configs, rm)
+
+    def _create_lm(self, lm_name: str) -> AzureOpenAIModel:
+        return AzureOpenAIModel(
+            client=self.client,
+            max_tokens=self.lm_max_tokens[lm_name],
+            stream=self.stream_tokens and lm_name in self.streaming_lms,
+            **self.azure_kwargs,
+        )
+
+
+# Initialize STORM runner factory
+def initialize_runner_factory():
+    """Initialize the factory that builds a STORM Wiki Runner per job"""
+    try:
+        runner_factory = StormRunnerFactory()
+        logger.info("Successfully initialized STORM Wiki Runner factory")
+        return runner_factory
     except Exception as e:
-        logger.error(f"Error initializing STORM Wiki Runner: {str(e)}")
+        logger.error(f"Error initializing STORM Wiki Runner factory: {str(e)}")
         logger.error(traceback.format_exc())
         return None
 
+def job_key(topic: str, report_language: str, config_fingerprint: str) -> str:
+    """Key identifying jobs that would produce the same report.
+
+    Topics are compared case-insensitively with whitespace collapsed, so "History of  Rome"
+    and "history of rome" share a key.
+    """
+    normalized_topic = " ".join(topic.casefold().split())
+    normalized_language = " ".join(report_language.casefold().split())
+    key = json.dumps([normalized_topic, normalized_language, config_fingerprint])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class JobEventFanout:
+    """Manager facade that delivers a job's events to every report subscribed to it.
+
+    When identical requests are coalesced, one job runs on behalf of several report_ids. The
+    job publishes through this object exactly as it would through the ConnectionManager, and
+    each event is re-addressed to every current subscriber. A subscriber that attaches after
+    the job started is first sent the events the job already published, replayed from the
+    leader's event log, so it sees the whole run before any live event.
+    """
+
+    # Events of the leader's log that belong to the leader's request rather than to the job
+    NOT_REPLAYED = {"processing_started"}
+
+    def __init__(self, manager, leader_id: str, subscribers: Callable[[], List[str]]):
+        self.manager = manager
+        self.leader_id = leader_id
+        self.subscribers = subscribers
+        # Subscribers present when the job starts receive every event live
+        self._attached = set(subscribers())
+        # Keeps replays and live events in order for each subscriber
+        self._lock = asyncio.Lock()
+
+    async def attach(self, subscriber_id: str):
+        """Catch a subscriber that joined the running job up on the events published so far."""
+        async with self._lock:
+            await self._catch_up(subscriber_id)
+
+    async def _catch_up(self, subscriber_id: str):
+        if subscriber_id in self._attached:
+            return
+        self._attached.add(subscriber_id)
+        events = await self.manager.logged_events(self.leader_id)
+        for event in events:
+            if event.get("event") in self.NOT_REPLAYED:
+                continue
+            data = {key: value for key, value in event.items() if key != "seq"}
+            await self.manager.send_update(subscriber_id, {**data, "report_id": subscriber_id})
+
+    async def send_update(self, report_id: str, data: dict):
+        async with self._lock:
+            subscriber_ids = self.subscribers()
+            # Before the leader logs this event, so it is not replayed as well as sent live
+            for subscriber_id in subscriber_ids:
+                await self._catch_up(subscriber_id)
+            for subscriber_id in subscriber_ids:
+                await self.manager.send_update(subscriber_id, {**data, "report_id": subscriber_id})
+
+    async def cleanup_connections_for_report(self, report_id: str):
+        for subscriber_id in self.subscribers():
+            await self.manager.cleanup_connections_for_report(subscriber_id)
+
+def insert_reference_links(content: str, references: dict) -> str:
+    """Turn the citation markers of an article into Markdown links to their sources."""
+    index_to_url = {
+        references['url_to_unified_index'][url]: url for url in references['url_to_info']
+    }
+    return ArticleTextProcessing.render_citation_links(content, index_to_url)
+
 def process_references(content: str, article_dir: str) -> str:
     """Process and insert references into the article content."""
     try:
-        with open(os.path.join(article_dir, "url_to_info.json"), 'r') as f:
+        with open(STORMWikiRunner.references_path(article_dir), 'r') as f:
             references = json.load(f)
-            
-        # Replace citation markers with proper references
-        for url, info in references['url_to_info'].items():
-            ref_num = references['url_to_unified_index'][url]
-            content = content.replace(f"[{ref_num}]", f"[[{ref_num}]]({url})")
-            
-        return content
+        return insert_reference_links(content, references)
     except FileNotFoundError:
         logger.warning(f"References file not found in {article_dir}")
         return content
@@ -92,20 +262,221 @@ def process_references(content: str, article_dir: str) -> str:
         logger.error(f"Error processing references: {str(e)}")
         return content
 
-async def run_storm_with_retry(runner, topic, report_id, article_dir, report_language, manager):
-    """Run STORM with limited retries for API calls"""
-    if runner is None:
-        raise ValueError("STORM Runner is not initialized")
-        
+def read_article_content(content_file: str) -> str:
+    """Read a generated article, falling back through common encodings."""
+    raw_content = None
+    encodings_to_try = ['utf-8', 'latin-1', 'windows-1252', 'cp1252']
+    
+    for encoding in encodings_to_try:
+        try:
+            with open(content_file, 'r', encoding=encoding) as f:
+                raw_content = f.read()
+            logger.info(f"Successfully read file using {encoding} encoding")
+            break
+        except UnicodeDecodeError:
+            logger.warning(f"Failed to decode with {encoding}, trying next encoding")
+            continue
+    
+    if raw_content is None:
+        with open(content_file, 'r', encoding='utf-8', errors='replace') as f:
+            raw_content = f.read()
+        logger.warning("Using replacement characters for undecodable bytes")
+    return raw_content
+
+def reference_index(references: dict) -> dict:
+    """Slim copy of url_to_info.json: citation indices, and per source its url, title and a
+    shortened description.
+
+    Snippets and search metadata are left out; `snippet_count` tells clients how many they can
+    fetch from /api/articles/{report_id}/references/{index}/snippets.
+    """
+    url_to_info = references.get("url_to_info", {})
+    slim_info = {}
+    for url in references.get("url_to_unified_index", {}):
+        info = url_to_info.get(url, {})
+        description = info.get("description", "")
+        if len(description) > REFERENCE_DESCRIPTION_CHARS:
+            description = description[:REFERENCE_DESCRIPTION_CHARS].rstrip() + "..."
+        slim_info[url] = {
+            "url": url,
+            "title": info.get("title", ""),
+            "description": description,
+            "snippet_count": len(info.get("snippets", [])),
+        }
+    return {
+        "url_to_unified_index": references.get("url_to_unified_index", {}),
+        "url_to_info": slim_info,
+    }
+
+def load_report_payload(article_dir: str) -> dict:
+    """Build the `data` of a `completed` event from a finished artifact directory.
+
+    `references` is the slim reference index (see `reference_index`), so the payload stays
+    small however many snippets the research collected.
+
+    Raises:
+        FileNotFoundError: If the polished article does not exist.
+    """
+    content_file = os.path.join(article_dir, "storm_gen_article_polished.txt")
+    raw_content = read_article_content(content_file)
+    
+    references_file = STORMWikiRunner.references_path(article_dir)
+    references = {}
     try:
-        # Update the runner's language setting
-        if report_language != "English":
-            # The args attribute contains the STORMWikiRunnerArguments object
-            runner.args.report_language = report_language
-            logger.info(f"Successfully updated STORM runner to use language: {report_language}")
+        with open(references_file, "r", encoding='utf-8') as f:
+            references = json.load(f)
+    except Exception as e:
+        logger.warning(f"Could not load references: {str(e)}")
+    
+    return report_payload(raw_content, references)
+
+def report_payload(raw_content: str, references: dict) -> dict:
+    """Build the `data` of a `completed` event from an article and its full reference map."""
+    if not references:
+        return {"raw_content": raw_content, "processed_content": raw_content, "references": {}}
+    return {
+        "raw_content": raw_content,
+        "processed_content": insert_reference_links(raw_content, references),
+        "references": reference_index(references)
+    }
+
+def load_reference(article_dir: str, index: int) -> Optional[dict]:
+    """Full details, snippets included, of the source cited as `[index]` in a finished report,
+    or None if no source has that index."""
+    with open(STORMWikiRunner.references_path(article_dir), "r", encoding="utf-8") as f:
+        references = json.load(f)
+    for url, ref_index in references.get("url_to_unified_index", {}).items():
+        if ref_index == index:
+            return {"index": index, **references["url_to_info"].get(url, {"url": url})}
+    return None
+
+def reference_details(reference: dict) -> dict:
+    """A source's details without its snippets, which are served page by page."""
+    details = {key: value for key, value in reference.items() if key != "snippets"}
+    details["snippet_count"] = len(reference.get("snippets", []))
+    return details
+
+def reference_snippets(reference: dict, offset: int, limit: int) -> dict:
+    """One page of a source's snippets."""
+    snippets = reference.get("snippets", [])
+    return {
+        "index": reference["index"],
+        "url": reference.get("url"),
+        "total": len(snippets),
+        "offset": offset,
+        "limit": limit,
+        "snippets": snippets[offset:offset + limit],
+    }
+
+def find_article_dir(report_id: str, job: Optional[dict] = None) -> Optional[str]:
+    """Artifact directory of a report, from its job record or by scanning the storage path."""
+    if job is not None and job.get("article_dir") and os.path.isdir(job["article_dir"]):
+        return job["article_dir"]
+    candidates = sorted(glob.glob(os.path.join(STORAGE_PATH, f"*_{report_id}")))
+    return candidates[-1] if candidates else None
+
+def _parse_range(range_header: str, size: int):
+    """Parse a single `bytes=` range into an inclusive (start, end) tuple.
+
+    Returns None for headers that should be ignored (other units or multiple ranges), and
+    raises ValueError for ranges that cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    if start == "":
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length <= 0:
+            raise ValueError(range_header)
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError(range_header)
+    return start, min(end, size - 1)
+
+def artifact_response(request: Request, body: bytes, media_type: str) -> Response:
+    """Serve report bytes with ETag revalidation, byte ranges and response compression.
+
+    - `If-None-Match` matching the strong ETag returns 304 without a body.
+    - A single `Range: bytes=...` (honoured unless `If-Range` names another ETag) returns 206
+      with the identity encoding, so interrupted downloads can be resumed.
+    - Otherwise the body is compressed with brotli (when installed) or gzip according to
+      `Accept-Encoding`.
+    """
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, len(body))
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{len(body)}"},
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            return Response(
+                content=body[start:end + 1],
+                status_code=206,
+                media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{len(body)}"},
+            )
+
+    accept_encoding = request.headers.get("accept-encoding", "").lower()
+    if brotli is not None and "br" in accept_encoding:
+        body = brotli.compress(body, quality=5)
+        headers["Content-Encoding"] = "br"
+    elif "gzip" in accept_encoding:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+async def run_storm_with_retry(runner_factory, topic, report_id, article_dir, report_language, manager, executor, resume=False, max_attempts=None, cancel_token=None, deadline=None):
+    """Run STORM with limited retries for API calls.
+
+    The blocking pipeline is executed on the job executor's worker pool so the event loop keeps
+    serving WebSocket traffic and other requests while the report is generated. Every stage is
+    checkpointed in the article directory, so a failed attempt is retried from its last
+    completed stage instead of from scratch, up to `max_attempts` attempts in total.
+
+    Once `cancel_token` is cancelled the pipeline stops before its next LM request or search
+    (streamed completions stop mid-stream) and JobCancelledError is raised without retrying. All attempts share the same `deadline`.
+
+    Returns the STORMWikiRunResult of the successful attempt.
+    """
+    if runner_factory is None:
+        raise ValueError("STORM Runner is not initialized")
+    if max_attempts is None:
+        max_attempts = int(os.getenv("STORM_MAX_JOB_ATTEMPTS", "2"))
         
+    def run_job(resume_from_checkpoint):
+        # Each job gets its own runner so concurrent reports never share topic, output
+        # directory or language settings.
+        runner = runner_factory.create_runner(report_language=report_language)
+        logger.info(f"Created STORM runner for report {report_id} using language: {report_language}")
+
+        # Stage progress is pushed to the report's WebSocket clients as it happens
+        callback_handler = WebSocketCallbackHandler(
+            report_id, manager, executor, max_conv_turn=runner.args.max_conv_turn
+        )
+
         # Run STORM normally (it will do its own retries via the OpenAI client)
-        runner.run(
+        return runner.run(
             topic=topic,
             article_dir=article_dir,
             do_research=True,
@@ -113,32 +484,76 @@ async def run_storm_with_retry(runner, topic, report_id, article_dir, report_lan
             do_generate_article=True,
             do_polish_article=True,
             remove_duplicate=False,
+            callback_handler=callback_handler,
+            resume=resume_from_checkpoint,
+            cancel_token=cancel_token,
+            deadline=deadline,
         )
-        
-        return True
-    except (APITimeoutError, RateLimitError, APIError) as e:
-        logger.error(f"OpenAI API error: {str(e)}")
-        await manager.send_update(report_id, {
-            "event": "error",
-            "report_id": report_id,
-            "message": f"OpenAI API error: {str(e)}. Please try again later.",
-            "should_delete": True
-        })
-        raise e
-    except Exception as e:
-        # Catch any other exceptions from the STORM runner
-        logger.error(f"Unexpected error in STORM runner: {str(e)}")
-        logger.error(traceback.format_exc())
-        
+
+    attempt = 1
+    while True:
+        try:
+            # Run STORM off the event loop
+            return await executor.run(run_job, resume or attempt > 1)
+        except JobCancelledError:
+            logger.info(f"STORM runner stopped for report {report_id}: {cancel_token.reason}")
+            raise
+        except (APITimeoutError, RateLimitError, APIError) as e:
+            logger.error(f"OpenAI API error: {str(e)}")
+            error = e
+            error_message = f"OpenAI API error: {str(e)}. Please try again later."
+        except Exception as e:
+            # Catch any other exceptions from the STORM runner
+            logger.error(f"Unexpected error in STORM runner: {str(e)}")
+            logger.error(traceback.format_exc())
+            error = e
+            error_message = f"Unexpected error: {str(e)}. Please try again."
+
+        if cancel_token is not None and cancel_token.is_cancelled:
+            raise JobCancelledError(cancel_token.reason)
+        if attempt >= max_attempts or (deadline is not None and deadline.expired):
+            await manager.send_update(report_id, {
+                "event": "error",
+                "report_id": report_id,
+                "message": error_message,
+                "should_delete": True
+            })
+            raise error
+
+        completed_stages = STORMWikiRunner.load_checkpoint(article_dir)["completed_stages"]
+        attempt += 1
+        logger.info(f"Retrying report {report_id} (attempt {attempt}/{max_attempts}) after stages: {completed_stages}")
         await manager.send_update(report_id, {
-            "event": "error",
+            "event": "resuming",
             "report_id": report_id,
-            "message": f"Unexpected error: {str(e)}. Please try again.",
-            "should_delete": True
+            "message": "Retrying from the last completed stage",
+            "attempt": attempt,
+            "completed_stages": completed_stages
         })
-        raise e
 
-async def generate_article_in_background(report_id: str, topic: str, report_language: str, runner, manager):
+def new_article_dir(report_id: str) -> str:
+    """Artifact directory for a new run of a report."""
+    current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(STORAGE_PATH, f"{current_datetime}_{report_id}")
+
+async def generate_article_in_background(report_id: str, topic: str, report_language: str, runner_factory, manager, executor, article_dir: str = None, resume: bool = False, cancel_token: CancellationToken = None, on_finished: Optional[Callable[[], None]] = None):
+    """Generate a report and push its progress and result over WebSocket.
+
+    If `resume` is set, `article_dir` holds a previous, interrupted run of the report and
+    generation restarts from its last checkpointed stage. Cancelling `cancel_token` (or
+    hitting the timeout) stops the pipeline before its next LM request or search.
+
+    The run gets a deadline slightly shorter than the timeout; LM and search calls are bounded
+    by it and optional stages are skipped when it is nearly spent, so a slow run still ends
+    with a best-effort report.
+
+    `completed` is only sent once the report's files are written and `on_finished` (e.g. marking
+    the job completed) has run, so a client may fetch the report from disk as soon as it gets it.
+
+    Returns True if the report was generated and delivered, False otherwise.
+    """
+    if cancel_token is None:
+        cancel_token = CancellationToken()
     try:
         # Update client that research is starting
         await manager.send_update(report_id, {
@@ -151,28 +566,39 @@ async def generate_article_in_background(report_id: str, topic: str, report_lang
         
         # Set a timeout for the STORM process
         try:
-            current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-            article_dir = os.path.join(STORAGE_PATH, f"{current_datetime}_{report_id}")
+            if article_dir is None:
+                article_dir = new_article_dir(report_id)
             
             # Run the STORM process with a timeout
+            deadline = Deadline(JOB_TIMEOUT - JOB_DEADLINE_MARGIN)
             runner_task = asyncio.create_task(
                 run_storm_with_retry(
-                    runner=runner,
+                    runner_factory=runner_factory,
                     topic=topic,
                     report_id=report_id,
                     article_dir=article_dir,
                     report_language=report_language, 
-                    manager=manager
+                    manager=manager,
+                    executor=executor,
+                    resume=resume,
+                    cancel_token=cancel_token,
+                    deadline=deadline
                 )
             )
             
-            # Wait for the runner to complete or timeout
-            await asyncio.wait_for(runner_task, timeout=600)  # 10 minute timeout
+            # Wait for the runner to complete or timeout; the task is shielded so that on timeout
+            # the worker thread can be stopped cooperatively instead of being left running
+            await asyncio.wait_for(asyncio.shield(runner_task), timeout=JOB_TIMEOUT)  # 10 minute timeout
             
         except asyncio.TimeoutError:
             error_msg = f"STORM process timed out after 10 minutes for topic: {topic}"
             logger.error(error_msg)
             
+            # Stop the pipeline and give it a moment to unwind from its current LM or search call
+            cancel_token.cancel("timeout")
+            runner_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            await asyncio.wait({runner_task}, timeout=30)
+            
             await manager.send_update(report_id, {
                 "event": "error",
                 "report_id": report_id,
@@ -181,9 +607,14 @@ async def generate_article_in_background(report_id: str, topic: str, report_lang
             })
             
             # Clean up connections
-            await asyncio.sleep(5)
             await manager.cleanup_connections_for_report(report_id)
-            return
+            return False
+        
+        except JobCancelledError:
+            # The client that cancelled the report has already been notified
+            logger.info(f"STORM runner cancelled for topic: {topic}")
+            await manager.cleanup_connections_for_report(report_id)
+            return False
         
         except Exception as e:
             error_msg = f"API error during STORM processing: {str(e)}"
@@ -198,19 +629,17 @@ async def generate_article_in_background(report_id: str, topic: str, report_lang
             })
             
             # Clean up connections
-            await asyncio.sleep(5)
             await manager.cleanup_connections_for_report(report_id)
-            return
+            return False
         
         # Continue with the rest of the original function after successful STORM run
         logger.info(f"STORM runner completed for topic: {topic}")
         
-        # Get the generated content
-
-        content_file = os.path.join(article_dir, "storm_gen_article_polished.txt")
+        # The runner hands over the article in memory; its files are still being written
+        result = runner_task.result()
         
-        if not os.path.exists(content_file):
-            error_msg = f"Content file not found at {content_file}"
+        if result.article is None:
+            error_msg = f"STORM runner produced no article for topic: {topic}"
             logger.error(error_msg)
             
             await manager.send_update(report_id, {
@@ -221,41 +650,32 @@ async def generate_article_in_background(report_id: str, topic: str, report_lang
             })
             
             # Clean up connections
-            await asyncio.sleep(5)
             await manager.cleanup_connections_for_report(report_id)
-            return
-        
-        # Read and process the generated content
-        raw_content = None
-        encodings_to_try = ['utf-8', 'latin-1', 'windows-1252', 'cp1252']
-        
-        for encoding in encodings_to_try:
-            try:
-                with open(content_file, 'r', encoding=encoding) as f:
-                    raw_content = f.read()
-                logger.info(f"Successfully read file using {encoding} encoding")
-                break
-            except UnicodeDecodeError:
-                logger.warning(f"Failed to decode with {encoding}, trying next encoding")
-                continue
+            return False
         
-        if raw_content is None:
-            with open(content_file, 'r', encoding='utf-8', errors='replace') as f:
-                raw_content = f.read()
-            logger.warning("Using replacement characters for undecodable bytes")
+        # Process the generated content
+        payload = report_payload(result.article.to_string(), result.references)
         
-        # Process references
-        processed_content = process_references(raw_content, article_dir)
+        logger.info(f"Successfully processed article for topic: {topic}")
         
-        references_file = os.path.join(article_dir, "url_to_info.json")
-        references = {}
+        # The report only counts as finished (and is served from disk) once its files are written
         try:
-            with open(references_file, "r", encoding='utf-8') as f:
-                references = json.load(f)
+            await asyncio.wrap_future(result.artifacts_written)
         except Exception as e:
-            logger.warning(f"Could not load references: {str(e)}")
+            logger.error(f"Failed to write the artifacts of report {report_id} to {article_dir}: {str(e)}")
+            
+            await manager.send_update(report_id, {
+                "event": "error",
+                "report_id": report_id,
+                "message": f"Error saving the report: {str(e)}",
+                "should_delete": True
+            })
+            
+            await manager.cleanup_connections_for_report(report_id)
+            return False
         
-        logger.info(f"Successfully processed article for topic: {topic}")
+        if on_finished is not None:
+            on_finished()
         
         # Notify of completion via WebSocket
         try:
@@ -263,21 +683,13 @@ async def generate_article_in_background(report_id: str, topic: str, report_lang
                 "event": "completed",
                 "report_id": report_id,
                 "message": "Report generation completed",
-                "data": {
-                    "raw_content": raw_content,
-                    "processed_content": processed_content,
-                    "references": references
-                }
+                "data": payload
             })
             logger.info(f"WebSocket completion message sent for report {report_id}")
             
-            # Add a delay before cleanup to ensure the message is received
-            await asyncio.sleep(5)
-            
             # Clean up all connections for this report
             await manager.cleanup_connections_for_report(report_id)
             logger.info(f"All connections cleaned up for report {report_id}")
-            
         except Exception as e:
             logger.error(f"Failed to send WebSocket completion message: {str(e)}")
             logger.error(traceback.format_exc())
@@ -289,8 +701,10 @@ async def generate_article_in_background(report_id: str, topic: str, report_lang
                 "should_delete": True
             })
             
-            await asyncio.sleep(5)
             await manager.cleanup_connections_for_report(report_id)
+            return False
+        
+        return True
         
     except Exception as e:
         logger.error(f"Error in background article generation: {str(e)}")
@@ -303,6 +717,6 @@ async def generate_article_in_background(report_id: str, topic: str, report_lang
             "should_delete": True  # Signal to delete the placeholder
         })
         
-        # Clean up connections on error after a delay
-        await asyncio.sleep(5)
-        await manager.cleanup_connections_for_report(report_id)
\ No newline at end of file
+        # Clean up connections on error
+        await manager.cleanup_connections_for_report(report_id)
+        return False
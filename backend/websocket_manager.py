@@ -1,105 +1,522 @@
 # websocket_manager.py
-from typing import Dict, List, Set
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set
 from fastapi import WebSocket, WebSocketDisconnect
+import asyncio
+import concurrent.futures
+import glob
 import logging
+import os
+import time
 import uuid
 import json
+import zlib
 
 logger = logging.getLogger(__name__)
 
-class ConnectionManager:
+def _write_spill_file(path: str, body: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+
+def _read_spill_file(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _remove_spill_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _log_spill_error(future: concurrent.futures.Future):
+    if future.exception() is not None:
+        logger.error(f"Could not spill an event to disk: {future.exception()}")
+
+class ReportEventLog:
+    """Log of the events sent for one report, numbered with increasing sequence numbers.
+
+    Entries are dicts with the event's `seq`, its serialized `size` and either the `message`
+    itself or the `path` of the file it was spilled to.
+    """
+
     def __init__(self):
-        # Maps report_id to a set of connected websockets
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
-        # Maps connection_id to report_id for lookup on disconnect
-        self.connection_map: Dict[str, str] = {}
-        # Queue of pending messages for reports without active connections
-        self.pending_messages: Dict[str, List[dict]] = {}
+        self.entries = deque()
+        self.last_seq = 0
+        self.memory_bytes = 0
+        self.last_active = time.monotonic()
+
+    def next_seq(self) -> int:
+        self.last_seq += 1
+        return self.last_seq
+
+    def append(self, entry: dict):
+        self.entries.append(entry)
+        if "message" in entry:
+            self.memory_bytes += entry["size"]
+        self.last_active = time.monotonic()
+
+    def pop_oldest(self) -> dict:
+        entry = self.entries.popleft()
+        if "message" in entry:
+            self.memory_bytes -= entry["size"]
+        return entry
+
+    def since(self, seq: int) -> List[dict]:
+        """Logged entries with a sequence number greater than `seq`."""
+        return [entry for entry in self.entries if entry["seq"] > seq]
+
+    @property
+    def first_seq(self) -> int:
+        return self.entries[0]["seq"] if self.entries else self.last_seq + 1
+
+# Events a slow client can miss without losing content: a later event supersedes them
+# (`section_ready` carries the full text of a streamed section).
+DROPPABLE_EVENTS = {"progress", "section_delta", "polish_delta"}
+
+# Wire protocols a client can request with `?protocol=`:
+# - "json": JSON text frames; `completed` is split into chunked raw and processed content.
+# - "compact": zlib-compressed JSON in binary frames; `completed` carries the article once with
+#   a citation map (index -> url and title) to render citations locally, and reference details
+#   are fetched on demand from /api/articles/{report_id}/references/{index}.
+PROTOCOLS = ("json", "compact")
+
+def compact_completion(message: dict) -> dict:
+    """The `completed` event in the compact protocol's form."""
+    data = message.get("data", {})
+    references = data.get("references") or {}
+    url_to_info = references.get("url_to_info", {})
+    citations = {
+        str(index): {"url": url, "title": url_to_info.get(url, {}).get("title", "")}
+        for url, index in references.get("url_to_unified_index", {}).items()
+    }
+    return {
+        **message,
+        "encoding": "compact",
+        "data": {"content": data.get("raw_content", ""), "citations": citations},
+    }
+
+def encode_compact(message: dict) -> bytes:
+    return zlib.compress(json.dumps(message, ensure_ascii=False).encode("utf-8"))
+
+class ClientConnection:
+    """One WebSocket client with its outbound queue, drained by its own writer task.
+
+    Queue items are lists of frames that are sent together (a chunked completion is a single
+    item, so it is never partly dropped), a task that returns such a list (a replay of spilled
+    events), or None to close the connection once drained. Frames are JSON-serializable dicts,
+    or bytes for binary frames.
+    """
+
+    def __init__(self, connection_id: str, report_id: str, websocket: WebSocket, protocol: str = "json"):
+        self.connection_id = connection_id
+        self.report_id = report_id
+        self.websocket = websocket
+        self.protocol = protocol
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+class ConnectionManager:
+    """Delivers report events to WebSocket clients.
+
+    Every event sent for a report is appended to a per-report log with a sequence number
+    (`seq`), whether or not a client is connected. A client connecting with `since=<seq>` is sent
+    only the logged events it has not seen yet, so a client may connect after the report started
+    and reconnect after a network failure without losing events.
+
+    The logs are bounded so clients that never connect cannot leak memory:
+    - each report keeps at most `max_log_events` events and `max_report_bytes` bytes in memory,
+      dropping its oldest events first;
+    - all logs together keep at most `max_total_bytes` bytes in memory, dropping the least
+      recently active reports first, and at most `max_logged_reports` reports;
+    - a report's log expires `ttl_seconds` after its last event or connection;
+    - events larger than `spill_bytes` (such as the `completed` payload) are written to
+      `spill_dir` and read back on replay, so they only cost a file on disk. Spill files are
+      written, read and removed on one background thread, in that order, so disk I/O never
+      blocks the event loop.
+    `stats()` reports the buffered and spilled bytes.
+
+    Each connection has its own outbound queue and writer task, so a slow client never delays
+    the others: `send_update` only queues messages. A connection whose queue holds
+    `max_queue_size` items is a slow consumer. With the "drop" policy, droppable events
+    (progress and streamed deltas) are skipped for it and anything else closes it; with the
+    "close" policy it is closed right away. Closing is safe because the client reconnects and
+    is replayed what it missed from the event log. A send that fails or takes longer than
+    `send_timeout` seconds closes only that connection.
+    """
+
+    def __init__(
+        self,
+        max_log_events: Optional[int] = None,
+        max_logged_reports: Optional[int] = None,
+        max_report_bytes: Optional[int] = None,
+        max_total_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        spill_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        max_queue_size: Optional[int] = None,
+        slow_client_policy: Optional[str] = None,
+        send_timeout: Optional[float] = None,
+    ):
+        if max_log_events is None:
+            max_log_events = int(os.getenv("STORM_EVENT_LOG_MAX_EVENTS", "1000"))
+        if max_logged_reports is None:
+            max_logged_reports = int(os.getenv("STORM_EVENT_LOG_MAX_REPORTS", "200"))
+        if max_report_bytes is None:
+            max_report_bytes = int(os.getenv("STORM_EVENT_LOG_MAX_REPORT_BYTES", str(1024 * 1024)))
+        if max_total_bytes is None:
+            max_total_bytes = int(os.getenv("STORM_EVENT_LOG_MAX_BYTES", str(32 * 1024 * 1024)))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("STORM_EVENT_LOG_TTL", "3600"))
+        if spill_bytes is None:
+            spill_bytes = int(os.getenv("STORM_EVENT_LOG_SPILL_BYTES", str(64 * 1024)))
+        if spill_dir is None:
+            spill_dir = os.getenv("STORM_EVENT_LOG_SPILL_DIR", os.path.join("storage", "event_spill"))
+        if max_queue_size is None:
+            max_queue_size = int(os.getenv("STORM_WS_QUEUE_SIZE", "256"))
+        if slow_client_policy is None:
+            slow_client_policy = os.getenv("STORM_WS_SLOW_CLIENT_POLICY", "drop")
+        if send_timeout is None:
+            send_timeout = float(os.getenv("STORM_WS_SEND_TIMEOUT", "10"))
+        if slow_client_policy not in ("drop", "close"):
+            raise ValueError(f"Unknown slow client policy: {slow_client_policy}")
+        self.max_log_events = max(1, max_log_events)
+        self.max_logged_reports = max(1, max_logged_reports)
+        self.max_report_bytes = max(0, max_report_bytes)
+        self.max_total_bytes = max(0, max_total_bytes)
+        self.ttl_seconds = ttl_seconds
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir
+        self.max_queue_size = max(1, max_queue_size)
+        self.slow_client_policy = slow_client_policy
+        self.send_timeout = send_timeout
+        # Maps report_id to its connections by connection_id
+        self.active_connections: Dict[str, Dict[str, ClientConnection]] = {}
+        # Maps connection_id, and each websocket, to its connection for lookup on disconnect
+        self.connections: Dict[str, ClientConnection] = {}
+        self.socket_connections: Dict[WebSocket, str] = {}
+        self._writers: Set[asyncio.Task] = set()
+        # Event logs of the most recently active reports, least recently active first
+        self.event_logs: "OrderedDict[str, ReportEventLog]" = OrderedDict()
+        self.buffered_bytes = 0
+        self.spilled_bytes = 0
+        self.spilled_events = 0
+        self.dropped_events = 0
+        self.expired_logs = 0
+        self.dropped_messages = 0
+        self.slow_closes = 0
+
+        # Spilled events of a previous run can no longer be replayed
+        os.makedirs(self.spill_dir, exist_ok=True)
+        for spill_file in glob.glob(os.path.join(self.spill_dir, "*.json")):
+            os.remove(spill_file)
+        # A single thread keeps spill I/O ordered: a file is read or removed only after it is written
+        self._spill_io = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="event-spill"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "reports": len(self.event_logs),
+            "events": sum(len(log.entries) for log in self.event_logs.values()),
+            "buffered_bytes": self.buffered_bytes,
+            "spilled_events": self.spilled_events,
+            "spilled_bytes": self.spilled_bytes,
+            "dropped_events": self.dropped_events,
+            "expired_logs": self.expired_logs,
+            "connections": len(self.connections),
+            "queued_messages": sum(connection.queue.qsize() for connection in self.connections.values()),
+            "dropped_messages": self.dropped_messages,
+            "slow_closes": self.slow_closes,
+        }
+
+    def _event_log(self, report_id: str) -> ReportEventLog:
+        self._expire_logs()
+        log = self.event_logs.get(report_id)
+        if log is None:
+            log = ReportEventLog()
+            self.event_logs[report_id] = log
+            while len(self.event_logs) > self.max_logged_reports:
+                self._drop_log(next(iter(self.event_logs)))
+        log.last_active = time.monotonic()
+        self.event_logs.move_to_end(report_id)
+        return log
+
+    def _expire_logs(self):
+        now = time.monotonic()
+        for report_id, log in list(self.event_logs.items()):
+            if now - log.last_active <= self.ttl_seconds:
+                break  # Logs are ordered by activity; the rest are fresher
+            if report_id in self.active_connections:
+                continue
+            self._drop_log(report_id)
+            self.expired_logs += 1
+
+    def _drop_log(self, report_id: str):
+        log = self.event_logs.pop(report_id)
+        while log.entries:
+            self._discard(log.pop_oldest())
+
+    def _discard(self, entry: dict):
+        if "path" in entry:
+            self.spilled_bytes -= entry["size"]
+            self.spilled_events -= 1
+            self._spill_io.submit(_remove_spill_file, entry["path"])
+        else:
+            self.buffered_bytes -= entry["size"]
+
+    def _log_event(self, report_id: str, data: dict) -> dict:
+        """Append an event to the report's log and return it with its sequence number."""
+        log = self._event_log(report_id)
+        message = {**data, "seq": log.next_seq()}
+        body = json.dumps(message)
+        entry = {"seq": message["seq"], "size": len(body)}
+        if entry["size"] > self.spill_bytes:
+            entry["path"] = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.json")
+            self._spill_io.submit(_write_spill_file, entry["path"], body).add_done_callback(
+                _log_spill_error
+            )
+            self.spilled_bytes += entry["size"]
+            self.spilled_events += 1
+        else:
+            entry["message"] = message
+            self.buffered_bytes += entry["size"]
+        log.append(entry)
+
+        # Enforce the per-report bounds, then the global memory bound
+        while log.entries and (
+            len(log.entries) > self.max_log_events or log.memory_bytes > self.max_report_bytes
+        ):
+            self._discard(log.pop_oldest())
+            self.dropped_events += 1
+        while self.buffered_bytes > self.max_total_bytes and len(self.event_logs) > 1:
+            oldest_report_id = next(iter(self.event_logs))
+            self.dropped_events += len(self.event_logs[oldest_report_id].entries)
+            self._drop_log(oldest_report_id)
+        return message
+
+    async def _load_event(self, entry: dict) -> Optional[dict]:
+        if "message" in entry:
+            return entry["message"]
+        try:
+            return await asyncio.wrap_future(self._spill_io.submit(_read_spill_file, entry["path"]))
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read spilled event {entry['seq']}: {e}")
+            return None
+    
+    async def logged_events(self, report_id: str, since: int = 0) -> List[dict]:
+        """The logged events of a report with a sequence number greater than `since`, oldest first."""
+        log = self.event_logs.get(report_id)
+        if log is None:
+            return []
+        events = []
+        for entry in list(log.since(since)):
+            message = await self._load_event(entry)
+            if message is not None:
+                events.append(message)
+        return events
     
-    async def connect(self, websocket: WebSocket, report_id: str):
+    async def connect(self, websocket: WebSocket, report_id: str, since: int = 0, protocol: str = "json"):
         connection_id = str(uuid.uuid4())
+        if protocol not in PROTOCOLS:
+            logger.warning(f"Unknown WebSocket protocol {protocol!r} requested, using json")
+            protocol = "json"
         await websocket.accept()
+        log = self._event_log(report_id)
         
-        if report_id not in self.active_connections:
-            self.active_connections[report_id] = set()
+        # Send initial connection confirmation, with the protocol the server agreed to
+        messages = [{
+            "event": "connected",
+            "report_id": report_id,
+            "message": "WebSocket connected successfully",
+            "protocol": protocol,
+            "last_seq": log.last_seq
+        }]
+        
+        if log.first_seq > since + 1:
+            messages.append({
+                "event": "events_truncated",
+                "report_id": report_id,
+                "message": "Some earlier events are no longer available",
+                "first_seq": log.first_seq
+            })
         
-        self.active_connections[report_id].add(websocket)
-        self.connection_map[connection_id] = report_id
+        # Queue the events the client has missed ahead of any live event. There is no await
+        # between reading the log and registering the connection, so live events never overtake
+        # or duplicate replayed ones. Spilled events are read back by a task queued in their
+        # place, which the writer awaits before sending anything queued after it.
+        missed = list(log.since(since))
+        replay = None
+        if any("path" in entry for entry in missed):
+            replay = asyncio.create_task(self._replay_frames(protocol, report_id, missed))
+        else:
+            messages.extend(entry["message"] for entry in missed)
+        if missed:
+            logger.info(f"Replaying {len(missed)} missed event(s) for report {report_id}")
         
-        logger.info(f"New connection {connection_id} for report {report_id}")
+        connection = ClientConnection(connection_id, report_id, websocket, protocol)
+        frames = []
+        for message in messages:
+            frames.extend(self._frames(protocol, report_id, message))
+        connection.queue.put_nowait(frames)
+        if replay is not None:
+            connection.queue.put_nowait(replay)
+        self._register(connection)
         
-        # Send any pending messages for this report
-        if report_id in self.pending_messages:
-            for message in self.pending_messages[report_id]:
-                try:
-                    await websocket.send_json(message)
-                    logger.info(f"Sent pending message for report {report_id}")
-                except Exception as e:
-                    logger.error(f"Failed to send pending message: {e}")
-            
-            # Clear the pending messages
-            del self.pending_messages[report_id]
+        logger.info(f"New {protocol} connection {connection_id} for report {report_id} (since seq {since})")
         
         # Return connection_id so it can be used to disconnect
         return connection_id
     
-    async def disconnect(self, websocket: WebSocket, connection_id: str):
-        if connection_id in self.connection_map:
-            report_id = self.connection_map[connection_id]
-            if report_id in self.active_connections:
-                if websocket in self.active_connections[report_id]:
-                    self.active_connections[report_id].remove(websocket)
-                
-                # Clean up empty sets
-                if not self.active_connections[report_id]:
-                    del self.active_connections[report_id]
-            
-            del self.connection_map[connection_id]
-            logger.info(f"Connection {connection_id} for report {report_id} disconnected")
+    async def _replay_frames(self, protocol: str, report_id: str, entries: List[dict]) -> list:
+        """The frames of logged events, reading spilled ones back from disk."""
+        frames = []
+        for entry in entries:
+            message = await self._load_event(entry)
+            if message is not None:
+                frames.extend(self._frames(protocol, report_id, message))
+        return frames
+
+    def _register(self, connection: "ClientConnection"):
+        self.active_connections.setdefault(connection.report_id, {})[connection.connection_id] = connection
+        self.connections[connection.connection_id] = connection
+        self.socket_connections[connection.websocket] = connection.connection_id
+        connection.writer = asyncio.create_task(self._write(connection))
+        self._writers.add(connection.writer)
+        connection.writer.add_done_callback(self._writers.discard)
+    
+    def _unregister(self, connection: "ClientConnection") -> bool:
+        """Remove a connection from the indexes; False if it was already removed."""
+        if self.connections.pop(connection.connection_id, None) is None:
+            return False
+        self.socket_connections.pop(connection.websocket, None)
+        report_connections = self.active_connections.get(connection.report_id)
+        if report_connections is not None:
+            report_connections.pop(connection.connection_id, None)
+            # Clean up empty maps
+            if not report_connections:
+                del self.active_connections[connection.report_id]
+        return True
+    
+    async def _write(self, connection: "ClientConnection"):
+        """Writer task of one connection: sends its queued messages in order.
+
+        A `None` item closes the connection once everything queued before it has been sent, and
+        a task item (a replay of spilled events) is awaited for its frames. A failed or timed-out
+        send drops only this connection.
+        """
+        websocket = connection.websocket
+        try:
+            while True:
+                frames = await connection.queue.get()
+                if isinstance(frames, asyncio.Future):
+                    frames = await frames
+                if frames is None:
+                    self._unregister(connection)
+                    await websocket.close()
+                    logger.info(f"Closed connection {connection.connection_id} for report {connection.report_id}")
+                    return
+                for frame in frames:
+                    send = websocket.send_bytes(frame) if isinstance(frame, bytes) else websocket.send_json(frame)
+                    await asyncio.wait_for(send, self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending to connection {connection.connection_id} for report {connection.report_id}: {e!r}")
+            await self._close_connection(connection)
+    
+    async def _close_connection(self, connection: "ClientConnection", code: int = 1011):
+        """Drop a connection right away, discarding its queued messages."""
+        if not self._unregister(connection):
+            return
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass  # The socket is usually already broken
+    
+    def _enqueue(self, connection: "ClientConnection", frames: list, droppable: bool) -> bool:
+        """Queue frames for a connection; False if it is too slow and must be closed."""
+        if connection.queue.qsize() < self.max_queue_size:
+            connection.queue.put_nowait(frames)
+            return True
+        if droppable and self.slow_client_policy == "drop":
+            connection.dropped += 1
+            self.dropped_messages += 1
+            return True
+        return False
+    
+    async def send_to_connection(self, connection_id: str, message: dict):
+        """Send a message (such as a pong) to one connection, after those already queued."""
+        connection = self.connections.get(connection_id)
+        if connection is None:
+            return
+        frames = self._frames(connection.protocol, connection.report_id, message)
+        if not self._enqueue(connection, frames, droppable=True):
+            await self._close_slow_connections([connection])
+    
+    async def _close_slow_connections(self, connections: List["ClientConnection"]):
+        for connection in connections:
+            logger.warning(
+                f"Closing slow connection {connection.connection_id} for report {connection.report_id} "
+                f"({connection.queue.qsize()} queued, {connection.dropped} dropped)"
+            )
+        self.slow_closes += len(connections)
+        # 1013 (try again later): the client reconnects and the event log replays what it missed
+        await asyncio.gather(*(self._close_connection(connection, code=1013) for connection in connections))
+    
+    async def disconnect(self, websocket: WebSocket, connection_id: Optional[str] = None):
+        if connection_id is None:
+            connection_id = self.socket_connections.get(websocket)
+        connection = self.connections.get(connection_id) if connection_id is not None else None
+        if connection is None or not self._unregister(connection):
+            return
+        if connection.writer is not None:
+            connection.writer.cancel()
+        logger.info(f"Connection {connection_id} for report {connection.report_id} disconnected")
     
     async def send_update(self, report_id: str, data: dict):
-        """Send update to all connected clients for a specific report"""
-        logger.info(f"Attempting to send update for report {report_id}, event: {data.get('event')}")
+        """Log an update and queue it for all connected clients for a specific report"""
+        logger.info(f"Attempting to send update for report {report_id}, event: {data.get('event')}", extra={"report_id": report_id})
+        data = self._log_event(report_id, data)
         
-        # If no connection exists yet, store the message for later delivery
-        if report_id not in self.active_connections:
-            logger.info(f"No active connections found for report {report_id}, queueing message")
-            if report_id not in self.pending_messages:
-                self.pending_messages[report_id] = []
-            self.pending_messages[report_id].append(data)
+        # Clients that connect later are sent the update from the event log
+        connections = self.active_connections.get(report_id)
+        if not connections:
+            logger.info(f"No active connections found for report {report_id}, update logged as seq {data['seq']}", extra={"report_id": report_id})
             return
         
-        # Check if we need to chunk the data (for completion events with large content)
-        if data.get("event") == "completed" and "data" in data:
-            await self.send_chunked_completion(report_id, data)
-            return
-            
-        if report_id in self.active_connections:
-            disconnected = set()
-            connection_count = len(self.active_connections[report_id])
-            logger.info(f"Found {connection_count} active connections for report {report_id}")
-            
-            for connection in self.active_connections[report_id]:
-                try:
-                    await connection.send_json(data)
-                    logger.info(f"Successfully sent update to a connection for report {report_id}")
-                except Exception as e:
-                    logger.error(f"Error sending to websocket for report {report_id}: {str(e)}")
-                    disconnected.add(connection)
-            
-            # Clean up any disconnected clients
-            for conn in disconnected:
-                for conn_id, rep_id in list(self.connection_map.items()):
-                    if rep_id == report_id:
-                        await self.disconnect(conn, conn_id)
-        else:
-            logger.warning(f"No active connections found for report {report_id}")
+        # Frames are encoded once per protocol; each connection's writer sends them
+        frames_by_protocol = {}
+        droppable = data.get("event") in DROPPABLE_EVENTS
+        slow = []
+        for connection in list(connections.values()):
+            frames = frames_by_protocol.get(connection.protocol)
+            if frames is None:
+                frames = frames_by_protocol[connection.protocol] = self._frames(connection.protocol, report_id, data)
+            if not self._enqueue(connection, frames, droppable):
+                slow.append(connection)
+        if slow:
+            await self._close_slow_connections(slow)
 
-    async def send_chunked_completion(self, report_id: str, data: dict):
-        """Send completion data in chunks to avoid WebSocket message size limitations"""
-        if report_id not in self.active_connections:
-            logger.warning(f"No active connections found for report {report_id}")
-            return
+    def _frames(self, protocol: str, report_id: str, message: dict) -> list:
+        """The frames that deliver one message to a client using `protocol`."""
+        if protocol == "compact":
+            if message.get("event") == "completed" and "data" in message:
+                message = compact_completion(message)
+            return [encode_compact(message)]
+        return self._outgoing_messages(report_id, message)
+
+    def _outgoing_messages(self, report_id: str, message: dict) -> List[dict]:
+        """The WebSocket messages that deliver one logged event."""
+        if message.get("event") == "completed" and "data" in message:
+            return self._completion_messages(report_id, message)
+        return [message]
+
+    def _completion_messages(self, report_id: str, data: dict) -> List[dict]:
+        """Split a `completed` event into chunk messages that all carry its sequence number"""
+        seq = data.get("seq")
         
         # Extract content data
         raw_content = data.get("data", {}).get("raw_content", "")
@@ -110,120 +527,58 @@ class ConnectionManager:
         chunk_size = 50000  # ~50KB per chunk
         
         # First send a "completion_started" event to prepare the client
-        start_message = {
+        messages = [{
             "event": "completion_chunks_started",
             "report_id": report_id,
             "message": "Starting to send completion data in chunks",
             "total_chunks": {
                 "raw_content": max(1, (len(raw_content) + chunk_size - 1) // chunk_size),
                 "processed_content": max(1, (len(processed_content) + chunk_size - 1) // chunk_size)
-            }
-        }
-        
-        # Send to all connections
-        disconnected = set()
-        for connection in self.active_connections[report_id]:
-            try:
-                await connection.send_json(start_message)
-            except Exception as e:
-                logger.error(f"Error sending to websocket for report {report_id}: {str(e)}")
-                disconnected.add(connection)
+            },
+            "seq": seq
+        }]
         
-        # Send raw content chunks
-        await self.send_content_chunks(report_id, "raw_content", raw_content, chunk_size, disconnected)
+        # Raw and processed content chunks
+        for content_type, content in (("raw_content", raw_content), ("processed_content", processed_content)):
+            chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+            for i, chunk in enumerate(chunks):
+                messages.append({
+                    "event": "completion_chunk",
+                    "report_id": report_id,
+                    "chunk_type": content_type,
+                    "chunk_index": i,
+                    "total_chunks": len(chunks),
+                    "data": chunk,
+                    "seq": seq
+                })
         
-        # Send processed content chunks
-        await self.send_content_chunks(report_id, "processed_content", processed_content, chunk_size, disconnected)
-        
-        # Send references (usually smaller, can be sent in one go)
-        references_message = {
+        # References (usually smaller, can be sent in one go)
+        messages.append({
             "event": "completion_chunk",
             "report_id": report_id,
             "chunk_type": "references",
             "chunk_index": 0,
             "total_chunks": 1,
-            "data": references
-        }
+            "data": references,
+            "seq": seq
+        })
         
-        for connection in self.active_connections[report_id]:
-            if connection not in disconnected:
-                try:
-                    await connection.send_json(references_message)
-                except Exception as e:
-                    logger.error(f"Error sending references to websocket: {str(e)}")
-                    disconnected.add(connection)
-        
-        # Send completion message
-        completion_message = {
+        # Completion message
+        messages.append({
             "event": "completion_chunks_finished",
             "report_id": report_id,
-            "message": "Report generation completed and all chunks sent"
-        }
-        
-        for connection in self.active_connections[report_id]:
-            if connection not in disconnected:
-                try:
-                    await connection.send_json(completion_message)
-                    logger.info(f"Completed sending chunked data for report {report_id}")
-                except Exception as e:
-                    logger.error(f"Error sending completion message: {str(e)}")
-                    disconnected.add(connection)
-        
-        # Clean up disconnected clients
-        for conn in disconnected:
-            for conn_id, rep_id in list(self.connection_map.items()):
-                if rep_id == report_id:
-                    await self.disconnect(conn, conn_id)
-
-    async def send_content_chunks(self, report_id: str, content_type: str, content: str, chunk_size: int, disconnected: set):
-        """Send content in chunks"""
-        chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
-        total_chunks = len(chunks)
-        
-        for i, chunk in enumerate(chunks):
-            chunk_message = {
-                "event": "completion_chunk",
-                "report_id": report_id,
-                "chunk_type": content_type,
-                "chunk_index": i,
-                "total_chunks": total_chunks,
-                "data": chunk
-            }
-            
-            for connection in self.active_connections[report_id]:
-                if connection not in disconnected:
-                    try:
-                        await connection.send_json(chunk_message)
-                        logger.info(f"Sent {content_type} chunk {i+1}/{total_chunks} for report {report_id}")
-                    except Exception as e:
-                        logger.error(f"Error sending chunk to websocket: {str(e)}")
-                        disconnected.add(connection)
-                        
-    # Add this to your ConnectionManager class
+            "message": "Report generation completed and all chunks sent",
+            "seq": seq
+        })
+        return messages
+
     async def cleanup_connections_for_report(self, report_id: str):
-        """Remove all connections for a specific report"""
-        if report_id in self.active_connections:
-            # Get all connection IDs for this report
-            connection_ids_to_remove = []
-            for conn_id, rep_id in list(self.connection_map.items()):
-                if rep_id == report_id:
-                    connection_ids_to_remove.append(conn_id)
-            
-            # Close and remove all connections
-            for connection in list(self.active_connections[report_id]):
-                try:
-                    await connection.close()
-                    logger.info(f"Closed a connection for report {report_id}")
-                except Exception as e:
-                    logger.error(f"Error closing connection: {str(e)}")
-            
-            # Remove from connection map
-            for conn_id in connection_ids_to_remove:
-                if conn_id in self.connection_map:
-                    del self.connection_map[conn_id]
-            
-            # Remove the report's entry
-            if report_id in self.active_connections:
-                del self.active_connections[report_id]
-                
-            logger.info(f"Cleaned up all connections for report {report_id}")
\ No newline at end of file
+        """Close all connections for a specific report once their queued messages are sent.
+
+        The report's event log is kept for reconnects.
+        """
+        connections = self.active_connections.pop(report_id, {})
+        for connection in connections.values():
+            connection.queue.put_nowait(None)
+        if connections:
+            logger.info(f"Closing {len(connections)} connection(s) for report {report_id}")
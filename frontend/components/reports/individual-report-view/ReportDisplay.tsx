@@ -63,6 +63,7 @@ export default function ReportDisplay({
 									<ReportSectionDisplay
 										section={section}
 										references={report.references}
+										reportId={report._id}
 									/>
 								</div>
 							))}
@@ -92,6 +93,7 @@ export default function ReportDisplay({
 							<ReportSectionDisplay
 								section={sections[currentSectionIndex]}
 								references={report.references}
+								reportId={report._id}
 							/>
 						</CardContent>
 					</Card>
@@ -7,15 +7,56 @@ import {
 	PopoverTrigger,
 } from "@/components/ui/popover";
 import { ReportSectionDisplayProps } from "@/types";
+import { getHost } from "@/utils/getHost";
 
 // This RegExp matches patterns like [1], [2], [3][4], etc.
 const CITATION_REGEX = /\[(\d+)\]/g;
 
+// Snippets fetched per request when a reference does not carry them inline
+const SNIPPETS_PAGE_SIZE = 5;
+
+interface SnippetPage {
+	snippets: string[];
+	total: number;
+}
+
 export default function ReportSectionDisplay({
 	section,
 	references,
+	reportId,
 }: ReportSectionDisplayProps) {
 	const [openPopoverId, setOpenPopoverId] = useState<string | null>(null);
+	// Snippets fetched from the backend, by citation number
+	const [fetchedSnippets, setFetchedSnippets] = useState<
+		Record<number, SnippetPage>
+	>({});
+
+	const loadSnippets = async (citationNumber: number, offset: number) => {
+		try {
+			const response = await fetch(
+				`${getHost()}/api/articles/${reportId}/references/${citationNumber}/snippets?offset=${offset}&limit=${SNIPPETS_PAGE_SIZE}`
+			);
+			if (!response.ok) {
+				throw new Error(`HTTP ${response.status}`);
+			}
+			const page = await response.json();
+			setFetchedSnippets((prev) => ({
+				...prev,
+				[citationNumber]: {
+					snippets: [
+						...(prev[citationNumber]?.snippets || []),
+						...page.snippets,
+					],
+					total: page.total,
+				},
+			}));
+		} catch (error) {
+			console.error(
+				`Error loading snippets for reference ${citationNumber}:`,
+				error
+			);
+		}
+	};
 
 	// Get URL by citation number from the references
 	const getUrlByCitationNumber = (citationNumber: number): string | null => {
@@ -32,10 +73,17 @@ export default function ReportSectionDisplay({
 	const getReferenceInfo = (citationNumber: number) => {
 		const url = getUrlByCitationNumber(citationNumber);
 		if (url) {
+			const info = references.url_to_info[url];
+			const fetched = fetchedSnippets[citationNumber];
+			const snippets = info.snippets || fetched?.snippets || [];
 			return {
 				number: citationNumber,
 				url: url,
-				info: references.url_to_info[url],
+				info: info,
+				snippets: snippets,
+				snippetTotal: info.snippets
+					? info.snippets.length
+					: fetched?.total ?? 0,
 			};
 		}
 		return null;
@@ -66,6 +114,14 @@ export default function ReportSectionDisplay({
 							open={openPopoverId === popoverId}
 							onOpenChange={(open) => {
 								setOpenPopoverId(open ? popoverId : null);
+								if (
+									open &&
+									!reference.info.snippets &&
+									(reference.info.snippet_count || 0) > 0 &&
+									!fetchedSnippets[citationNumber]
+								) {
+									loadSnippets(citationNumber, 0);
+								}
 							}}
 						>
 							<PopoverTrigger asChild>
@@ -98,13 +154,13 @@ export default function ReportSectionDisplay({
 										{reference.url}
 									</a>
 
-									{reference.info.snippets.length > 0 && (
+									{reference.snippets.length > 0 && (
 										<div className="mt-2 text-sm">
 											<div className="font-medium mb-1 dark:text-gray-100">
 												Snippets:
 											</div>
 											<ul className="list-disc pl-5">
-												{reference.info.snippets.map(
+												{reference.snippets.map(
 													(snippet, i) => (
 														<li
 															key={i}
@@ -115,13 +171,31 @@ export default function ReportSectionDisplay({
 													)
 												)}
 											</ul>
+											{reference.snippets.length <
+												reference.snippetTotal && (
+												<button
+													type="button"
+													className="text-xs text-blue-500 hover:underline"
+													onClick={() =>
+														loadSnippets(
+															citationNumber,
+															reference.snippets
+																.length
+														)
+													}
+												>
+													Show more snippets
+												</button>
+											)}
 										</div>
 									)}
 
-									<div className="mt-2 text-xs text-gray-500 dark:text-gray-100">
-										Search query:{" "}
-										{reference.info.meta.query}
-									</div>
+									{reference.info.meta?.query && (
+										<div className="mt-2 text-xs text-gray-500 dark:text-gray-100">
+											Search query:{" "}
+											{reference.info.meta.query}
+										</div>
+									)}
 								</div>
 							</PopoverContent>
 						</Popover>
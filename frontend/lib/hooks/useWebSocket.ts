@@ -16,6 +16,7 @@ interface WebSocketMessage {
 	chunk_index?: number;
 	total_chunks?: number | { [key: string]: number };
 	should_delete?: boolean;
+	seq?: number;
 }
 
 interface UseWebSocketReturn {
@@ -59,6 +60,8 @@ export function useWebSocket(): UseWebSocketReturn {
 	const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
 	const connectionTimeoutRef = useRef<NodeJS.Timeout | null>(null);
 	const reconnectAttemptsRef = useRef(0);
+	// Last event sequence number received, so a reconnect only replays missed events
+	const lastSeqRef = useRef(0);
 	const MAX_RECONNECT_ATTEMPTS = 3;
 
 	// Function to keep WebSocket alive with ping/pong
@@ -127,25 +130,32 @@ export function useWebSocket(): UseWebSocketReturn {
 				disconnect();
 			}
 
+			const isReconnect =
+				reportIdRef.current === reportId && lastSeqRef.current > 0;
+			if (!isReconnect) {
+				lastSeqRef.current = 0;
+			}
 			reportIdRef.current = reportId;
 			const fullHost = getHost();
 			const protocol = fullHost.includes("https") ? "wss:" : "ws:";
 			const cleanHost = fullHost
 				.replace("http://", "")
 				.replace("https://", "");
-			const wsUrl = `${protocol}//${cleanHost}/ws/reports/${reportId}`;
+			const wsUrl = `${protocol}//${cleanHost}/ws/reports/${reportId}?since=${lastSeqRef.current}`;
 
 			// console.log("WS URL: ", wsUrl);
 
 			setStatus("connecting");
 
-			// Reset chunking state when connecting
-			setContentChunks({
-				raw_content: [],
-				processed_content: [],
-				references: null,
-			});
-			setIsChunkingComplete(false);
+			// Reset chunking state when connecting to a new report
+			if (!isReconnect) {
+				setContentChunks({
+					raw_content: [],
+					processed_content: [],
+					references: null,
+				});
+				setIsChunkingComplete(false);
+			}
 
 			const ws = new WebSocket(wsUrl);
 			websocketRef.current = ws;
@@ -168,6 +178,15 @@ export function useWebSocket(): UseWebSocketReturn {
 					const data: WebSocketMessage = JSON.parse(event.data);
 					setLastMessage(data);
 
+					// Chunks of a completed event share its seq; it only counts as received once all chunks arrived
+					if (
+						typeof data.seq === "number" &&
+						data.event !== "completion_chunks_started" &&
+						data.event !== "completion_chunk"
+					) {
+						lastSeqRef.current = data.seq;
+					}
+
 					// Handle specific events
 					switch (data.event) {
 						case "connected":
@@ -34,10 +34,13 @@ export interface InfoMeta {
 export interface UrlInfo {
 	url: string;
 	description: string;
-	snippets: string[];
+	// Older reports carry snippets and meta inline; newer ones carry snippet_count
+	// and fetch their snippets from the backend on demand
+	snippets?: string[];
 	title: string;
-	meta: InfoMeta;
-	citation_uuid: number;
+	meta?: InfoMeta;
+	citation_uuid?: number;
+	snippet_count?: number;
 }
 
 export interface UrlToUnifiedIndex {
@@ -63,4 +66,5 @@ export interface ReportSection {
 export interface ReportSectionDisplayProps {
 	section: ReportSection;
 	references: ReportReferences;
+	reportId: string;
 }